@@ -0,0 +1,18 @@
+# Generated by Django 2.2.10 on 2026-10-18 07:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='defaultaccount',
+            name='cv_counter',
+            field=models.PositiveIntegerField(default=0, verbose_name='licznik CV'),
+        ),
+    ]
@@ -113,6 +113,7 @@ class DefaultAccount(models.Model):
     phone_number = PhoneNumberField(verbose_name='numer telefonu')
     facility_name = models.CharField(max_length=60, verbose_name='nazwa placówki')
     facility_address = models.OneToOneField(Address, on_delete=models.CASCADE, null=True, blank=True, verbose_name='adres placówki')
+    cv_counter = models.PositiveIntegerField(default=0, verbose_name='licznik CV')
 
 
 class EmployerAccount(models.Model):
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.10 on 2026-10-18 08:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['thread', 'timestamp', 'id'], name='chat_message_thread_time_idx'),
+        ),
+    ]
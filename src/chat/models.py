@@ -85,4 +85,8 @@ class ChatMessage(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['timestamp']
\ No newline at end of file
+        ordering = ['timestamp']
+        indexes = [
+            # keyset pagination of the thread history, see ChatMessagesPagination
+            models.Index(fields=['thread', 'timestamp', 'id'], name='chat_message_thread_time_idx'),
+        ]
\ No newline at end of file
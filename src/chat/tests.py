@@ -1,3 +1,76 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.contrib.auth.models import Group
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from account.account_status import AccountStatus
+from account.account_type import AccountType, StaffGroupType
+from account.models import Account
+from chat.models import ChatMessage, Thread
 
-# Create your tests here.
+
+def create_chat_user(username, account_type=AccountType.STANDARD):
+    user = Account.objects.create_user(username=username, password='testuser', first_name='test', last_name='test',
+                                       email=f'{username}@test.com')
+    user.type = account_type.value
+    user.status = AccountStatus.VERIFIED.value
+    user.save()
+    if account_type == AccountType.STAFF:
+        group, _ = Group.objects.get_or_create(name=StaffGroupType.STAFF_CHAT_ACCESS.value)
+        user.groups.add(group)
+    return user
+
+
+class ThreadMessagesTestCase(APITestCase):
+
+    def setUp(self):
+        self.url = '/chat/staff/messages/'
+        self.user = create_chat_user('user')
+        self.staff = create_chat_user('staff', AccountType.STAFF)
+        self.thread = Thread.objects.create(first=self.user, second=self.staff)
+        start = timezone.now() - timedelta(days=1)
+        self.messages = []
+        for i in range(5):
+            sender, recipient = (self.user, self.staff) if i % 2 else (self.staff, self.user)
+            message = ChatMessage.objects.create(thread=self.thread, sender=sender, recipient=recipient,
+                                                 message=f'wiadomość {i}')
+            self.messages.append(message)
+        # two messages sent at the same time are told apart by their ids
+        timestamps = [start, start + timedelta(minutes=1), start + timedelta(minutes=1), start + timedelta(minutes=2),
+                      start + timedelta(minutes=3)]
+        for message, timestamp in zip(self.messages, timestamps):
+            ChatMessage.objects.filter(id=message.id).update(timestamp=timestamp)
+        self.expected = [message.message for message in
+                         ChatMessage.objects.order_by('timestamp', 'id')]
+
+    def test_messages_pages(self):
+        self.client.force_authenticate(user=self.user)
+        received = []
+        url = self.url + '?page_size=2'
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEquals(response.status_code, status.HTTP_200_OK, msg=response.data)
+            received = [message['message'] for message in response.data['results']] + received
+            url = response.data['next']
+            pages += 1
+        self.assertEquals(pages, 3)
+        self.assertEquals(received, self.expected)
+
+    def test_messages_latest_page(self):
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(6):
+            response = self.client.get(self.url, {'page_size': 3})
+        self.assertEquals([message['message'] for message in response.data['results']], self.expected[2:])
+        self.assertEquals(response.data['results'][-1]['sender']['username'], 'staff')
+        self.assertIsNotNone(response.data['next'])
+
+    def test_messages_invalid_cursor(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {'before': 'rubbish'})
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_messages_unknown_user(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/chat/nobody/messages/')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -5,5 +5,6 @@ app_name = 'chat'
 urlpatterns = [
     path("", InboxView.as_view()),
     path("contacts/", ContactListView.as_view()),
+    re_path(r"^(?P<username>[^/\s]+)/messages/$", ThreadMessagesView.as_view()),
     re_path(r"^(?P<username>\S+)/$", ThreadView.as_view())
 ]
\ No newline at end of file
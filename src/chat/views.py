@@ -1,4 +1,11 @@
+import binascii
+import uuid
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+import coreapi
+import coreschema
 from rest_framework import status, views
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -13,9 +20,11 @@ from .serializers import *
 from .models import *
 from .filters import *
 from job.views import ErrorResponse, MessageResponse, sample_error_response, sample_message_response
-from django.db.models import Q
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.utils.dateparse import parse_datetime
 from rest_framework.filters import OrderingFilter
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
 from django.utils.decorators import method_decorator
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -27,6 +36,77 @@ class ChatPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class ChatMessagesPagination(BasePagination):
+    """
+    Keyset pagination over (timestamp, id), newest messages first. A page holds the messages
+    sent before the message given by the before cursor, in chronological order, and the next
+    link loads the older ones.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'before'
+    invalid_cursor_message = 'Nieprawidłowy kursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        before = self.decode_cursor(request)
+        if before:
+            timestamp, message_id = before
+            queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id))
+        messages = list(queryset.order_by('-timestamp', '-id')[:page_size + 1])
+        self.has_older = len(messages) > page_size
+        messages = messages[:page_size]
+        self.oldest = messages[-1] if messages else None
+        return messages[::-1]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            timestamp, message_id = b64decode(cursor.encode('ascii')).decode('ascii').split('|')
+            timestamp = parse_datetime(timestamp)
+            message_id = uuid.UUID(message_id)
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, message_id
+
+    @staticmethod
+    def encode_cursor(message):
+        return b64encode(f'{message.timestamp.isoformat()}|{message.id}'.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_older:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.oldest))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(name=self.cursor_query_param, required=False, location='query',
+                          schema=coreschema.String(description='Kursor z linku "next", zwraca starsze wiadomości')),
+            coreapi.Field(name=self.page_size_query_param, required=False, location='query',
+                          schema=coreschema.Integer(description='Liczba wiadomości na stronie')),
+        ]
+
+
 class InboxView(ListAPIView):
     serializer_class = ThreadSerializer
     pagination_class = ChatPagination
@@ -82,4 +162,33 @@ class ThreadView(RetrieveAPIView):
         other_username = self.kwargs['username']
 
         thread = Thread.objects.get_or_new(user, other_username)[0]
-        return thread
\ No newline at end of file
+        if thread is not None:
+            prefetch_related_objects([thread], Prefetch('messages', ChatMessage.objects.select_related('sender')))
+        return thread
+
+
+@method_decorator(name='get', decorator=swagger_auto_schema(
+    responses={
+        '404': sample_error_response('Nie znaleziono użytkownika'),
+        '403': sample_error_response('Brak uprawnień do rozmowy z tym użytkownikiem')
+    },
+    operation_description="Zwraca historię rozmowy z danym użytkownikiem, od najnowszych wiadomości. Strona zawiera "
+                          "wiadomości w kolejności chronologicznej, a link next prowadzi do starszych wiadomości."
+))
+class ThreadMessagesView(ListAPIView):
+    permission_classes = (IsStaffWithChatAccess | IsEmployer | IsStandardUser, )
+    serializer_class = ChatMessageSerializer
+    pagination_class = ChatMessagesPagination
+    thread = None
+
+    def get_queryset(self):
+        return ChatMessage.objects.filter(thread=self.thread).select_related('sender')
+
+    def list(self, request, *args, **kwargs):
+        try:
+            self.thread = Thread.objects.get_or_new(request.user.username, kwargs['username'])[0]
+        except Account.DoesNotExist:
+            return ErrorResponse('Nie znaleziono użytkownika', status.HTTP_404_NOT_FOUND)
+        if self.thread is None:
+            return ErrorResponse('Brak uprawnień do rozmowy z tym użytkownikiem', status.HTTP_403_FORBIDDEN)
+        return super().list(request, *args, **kwargs)
\ No newline at end of file
@@ -1,5 +1,15 @@
+import logging
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
 
 class CvConfig(AppConfig):
     name = 'cv'
+
+    def ready(self):
+        from .utilities import precompile_templates
+        try:
+            precompile_templates()
+        except Exception:
+            logger.exception('Precompiling CV templates failed')
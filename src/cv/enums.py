@@ -0,0 +1,10 @@
+class RenderStatus:
+    PENDING = 'pending'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    choices = (
+        (PENDING, 'pending'),
+        (READY, 'ready'),
+        (FAILED, 'failed')
+    )
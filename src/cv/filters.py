@@ -2,10 +2,14 @@ from collections import namedtuple
 from django_filters import rest_framework as filters
 from drf_yasg.inspectors import CoreAPICompatInspector, NotHandled
 from rest_framework.filters import OrderingFilter
-from django.db.models import Count
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models import Case, Count, IntegerField, Q, Value, When
 from .models import CV
 import re
 
+SEARCH_FIELDS = ['basic_info__first_name', 'basic_info__last_name', 'basic_info__email']
+
 CustomOrderingParams = namedtuple('CustomOrderingParams', ['related', 'annotate'])
 
 
@@ -48,6 +52,10 @@ class CvOrderingFilter(OrderingFilter):
             else:
                 return item
 
+        # results of a search keep their relevance order unless the ordering is given explicitly
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get(self.ordering_param):
+            return queryset
+
         ordering = self.get_ordering(request, queryset, view)
         if ordering:
             custom_ordering = [get_ordering_item(item) for item in ordering]
@@ -63,7 +71,30 @@ class CVListFilter(filters.FilterSet):
     date_created = filters.DateFromToRangeFilter(field_name='date_created')
     has_picture = filters.BooleanFilter(field_name='has_picture')
     was_reviewed = filters.BooleanFilter(field_name='was_reviewed')
+    q = filters.CharFilter(method='search', label='Wyszukuje po imieniu, nazwisku i adresie email')
 
     class Meta:
         model = CV
-        fields = ['first_name', 'last_name', 'email', 'date_created', 'has_picture', 'was_reviewed']
+        fields = ['first_name', 'last_name', 'email', 'date_created', 'has_picture', 'was_reviewed', 'q']
+
+    def search(self, queryset, name, value):
+        """
+        Every word of the query has to appear in one of the searched fields. On PostgreSQL
+        the lookups use the trigram indexes and results are ranked by trigram similarity,
+        elsewhere prefix matches of the whole query come first.
+        """
+        for term in value.split():
+            term_filter = Q()
+            for field in SEARCH_FIELDS:
+                term_filter |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(term_filter)
+
+        if connections[queryset.db].vendor == 'postgresql':
+            similarities = [TrigramSimilarity(field, value) for field in SEARCH_FIELDS]
+            rank = sum(similarities[1:], similarities[0])
+        else:
+            prefix_filter = Q()
+            for field in SEARCH_FIELDS:
+                prefix_filter |= Q(**{f'{field}__istartswith': value})
+            rank = Case(When(prefix_filter, then=Value(1)), default=Value(0), output_field=IntegerField())
+        return queryset.annotate(search_rank=rank).order_by('-search_rank', '-date_created')
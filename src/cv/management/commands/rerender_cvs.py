@@ -0,0 +1,110 @@
+import argparse
+import multiprocessing
+import time
+from multiprocessing.util import Finalize
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils.dateparse import parse_date
+from cv.enums import RenderStatus
+from cv.models import CV
+from cv.renderers import close_renderer
+from cv.rendering import render_cv_or_fail
+from cv.templates.templates import TEMPLATES_CHOICES
+
+
+def date_argument(value):
+    date = parse_date(value)
+    if not date:
+        raise argparse.ArgumentTypeError(f'Invalid date "{value}", expected YYYY-MM-DD')
+    return date
+
+
+def _init_worker():
+    # connections inherited from the parent process must not be shared
+    connections.close_all()
+    Finalize(None, close_renderer, exitpriority=10)
+    Finalize(None, connections.close_all, exitpriority=10)
+
+
+def _render(args):
+    cv_id, force = args
+    # an error of one CV marks it as failed instead of stopping the whole run
+    return cv_id, render_cv_or_fail(cv_id, force=force)
+
+
+class Command(BaseCommand):
+    help = 'Generates the documents of existing CVs again, e.g. after a template was changed. ' \
+           'CVs whose documents are already up to date are skipped, so an interrupted run can be resumed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--template', choices=[name for (name, filename) in TEMPLATES_CHOICES],
+                            help='Only CVs using this template')
+        parser.add_argument('--created-from', type=date_argument, help='Only CVs created on or after this date')
+        parser.add_argument('--created-to', type=date_argument, help='Only CVs created on or before this date')
+        verification = parser.add_mutually_exclusive_group()
+        verification.add_argument('--verified', action='store_true', help='Only verified CVs')
+        verification.add_argument('--unverified', action='store_true', help='Only unverified CVs')
+        parser.add_argument('--workers', type=int, default=1, help='Number of rendering processes')
+        parser.add_argument('--throttle', type=float, default=0,
+                            help='Minimum number of seconds between starting two renders')
+        parser.add_argument('--force', action='store_true', help='Render CVs even if their documents are up to date')
+
+    def get_queryset(self, options):
+        cvs = CV.objects.all()
+        if options['template']:
+            cvs = cvs.filter(template=options['template'])
+        if options['created_from']:
+            cvs = cvs.filter(date_created__date__gte=options['created_from'])
+        if options['created_to']:
+            cvs = cvs.filter(date_created__date__lte=options['created_to'])
+        if options['verified']:
+            cvs = cvs.filter(is_verified=True)
+        if options['unverified']:
+            cvs = cvs.filter(is_verified=False)
+        return cvs.order_by('date_created', 'cv_id')
+
+    @staticmethod
+    def get_jobs(cv_ids, force, throttle):
+        for i, cv_id in enumerate(cv_ids):
+            if i and throttle:
+                time.sleep(throttle)
+            yield cv_id, force
+
+    def handle(self, *args, **options):
+        cv_ids = list(self.get_queryset(options).values_list('cv_id', flat=True))
+        total = len(cv_ids)
+        if not total:
+            self.stdout.write('No CVs to render')
+            return
+
+        jobs = self.get_jobs(cv_ids, options['force'], options['throttle'])
+        workers = max(options['workers'], 1)
+        counts = {RenderStatus.READY: 0, RenderStatus.FAILED: 0, None: 0}
+        pool = None
+        if workers > 1:
+            connections.close_all()
+            pool = multiprocessing.Pool(workers, initializer=_init_worker)
+            results = pool.imap_unordered(_render, jobs)
+        else:
+            results = map(_render, jobs)
+
+        try:
+            for done, (cv_id, render_status) in enumerate(results, 1):
+                counts[render_status] += 1
+                if render_status == RenderStatus.FAILED:
+                    self.stdout.write(self.style.ERROR(f'[{done}/{total}] {cv_id}: failed'))
+                else:
+                    self.stdout.write(f'[{done}/{total}] {cv_id}: {render_status or "deleted"}')
+        except KeyboardInterrupt:
+            if pool:
+                pool.terminate()
+            self.stdout.write(self.style.WARNING('Interrupted, run the command again to resume'))
+            raise
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{counts[RenderStatus.READY]} of {total} CVs ready, '
+            f'{counts[RenderStatus.FAILED]} failed, {counts[None]} no longer exist'))
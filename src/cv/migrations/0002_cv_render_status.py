@@ -0,0 +1,24 @@
+# Generated by Django 2.2.10 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0001_initial'),
+    ]
+
+    operations = [
+        # documents of already existing CVs were generated synchronously
+        migrations.AddField(
+            model_name='cv',
+            name='render_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('ready', 'ready'), ('failed', 'failed')], default='ready', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='cv',
+            name='render_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('ready', 'ready'), ('failed', 'failed')], default='pending', max_length=10),
+        ),
+    ]
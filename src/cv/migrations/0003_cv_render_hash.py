@@ -0,0 +1,18 @@
+# Generated by Django 2.2.10 on 2026-10-18 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0002_cv_render_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cv',
+            name='render_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
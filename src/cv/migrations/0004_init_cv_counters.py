@@ -0,0 +1,27 @@
+import re
+from django.db import migrations
+
+
+def init_cv_counters(apps, schema_editor):
+    CV = apps.get_model('cv', 'CV')
+    DefaultAccount = apps.get_model('account', 'DefaultAccount')
+    pattern = re.compile(r'.*_.*_.*_(\d+)')
+    counters = {}
+    for cv_user_id, name in CV.objects.values_list('cv_user_id', 'name').iterator():
+        match = re.match(pattern, name or '')
+        if match:
+            counters[cv_user_id] = max(counters.get(cv_user_id, 0), int(match.group(1)))
+    for cv_user_id, counter in counters.items():
+        DefaultAccount.objects.filter(pk=cv_user_id).update(cv_counter=counter)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_defaultaccount_cv_counter'),
+        ('cv', '0003_cv_render_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(init_cv_counters, migrations.RunPython.noop),
+    ]
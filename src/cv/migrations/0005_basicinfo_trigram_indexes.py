@@ -0,0 +1,33 @@
+from django.db import migrations
+
+SEARCH_FIELDS = ['first_name', 'last_name', 'email']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for field in SEARCH_FIELDS:
+        # the expression matches the one django uses for icontains lookups
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS cv_basicinfo_{field}_trgm '
+            f'ON cv_basicinfo USING gin (UPPER({field}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS cv_basicinfo_{field}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0004_init_cv_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
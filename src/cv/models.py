@@ -1,14 +1,16 @@
 import datetime
-import re
 from django.utils import timezone
 import uuid
 from account.models import Account, DefaultAccount
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.db.models.signals import *
 from django.dispatch import receiver
+from .enums import RenderStatus
+from .utilities import delete_picture_variants
 import os
 
 
@@ -25,14 +27,13 @@ def validate_cv_id(cv_id):
         raise ValidationError('%(value)s is not a cv id', params={'value': cv_id})
 
 def get_cv_number(cv_user):
-    cvs = CV.objects.filter(cv_user=cv_user)
-    numbers = [0]
-    pattern = re.compile('.*_.*_.*_(\d+)')
-    for cv in cvs:
-        group = re.match(pattern, cv.name)
-        if group:
-            numbers.append(int(group.group(1)))
-    return max(numbers) + 1
+    """
+    Returns the next number for the name of a new CV of the user.
+    The counter is incremented in the database, so concurrent creates never get the same number.
+    """
+    with transaction.atomic():
+        DefaultAccount.objects.filter(pk=cv_user.pk).update(cv_counter=F('cv_counter') + 1)
+        return DefaultAccount.objects.filter(pk=cv_user.pk).values_list('cv_counter', flat=True).get()
 
 
 class CV(models.Model):
@@ -44,6 +45,9 @@ class CV(models.Model):
     was_reviewed = models.BooleanField(default=False)
     has_picture = models.BooleanField(default=False)
     document = models.FileField(upload_to='cv_docs/%Y/%m/%d/')
+    render_status = models.CharField(max_length=10, choices=RenderStatus.choices, default=RenderStatus.PENDING)
+    render_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    render_requested_at = models.DateTimeField(null=True, blank=True)
     date_created = models.DateTimeField(default=timezone.now)
 
     def save(self, *args, **kwargs):
@@ -109,6 +113,7 @@ def delete_picture(sender, instance, **kwargs):
     when corresponding `BasicInfo` object is deleted.
     """
     if instance.picture:
+        delete_picture_variants(instance.picture.path)
         if os.path.isfile(instance.picture.path):
             os.remove(instance.picture.path)
 
@@ -127,6 +132,7 @@ def delete_previous_picture(instance):
         return False
 
     if old_file:
+        delete_picture_variants(old_file.path)
         if os.path.isfile(old_file.path):
             os.remove(old_file.path)
 
@@ -140,21 +146,3 @@ def delete_cv_file(sender, instance, **kwargs):
     if instance.document:
         if os.path.isfile(instance.document.path):
             os.remove(instance.document.path)
-
-
-def delete_previous_cv_file(instance):
-    """
-    Deletes old cv document from filesystem
-    when corresponding `CV` object is updated.
-    """
-    if not instance.pk:
-        return False
-
-    try:
-        old_file = CV.objects.get(pk=instance.pk).document
-    except CV.DoesNotExist:
-        return False
-
-    if old_file:
-        if os.path.isfile(old_file.path):
-            os.remove(old_file.path)
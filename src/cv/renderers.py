@@ -0,0 +1,204 @@
+import atexit
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import pdfkit
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def _get_pdfkit_config():
+    return pdfkit.configuration(wkhtmltopdf=settings.WKHTMLTOPDF_BINARY)
+
+
+def get_renderer():
+    """
+    Returns the process-wide renderer configured in CV_RENDERER.
+    """
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            backend = import_string(settings.CV_RENDERER['BACKEND'])
+            _renderer = backend(**settings.CV_RENDERER.get('OPTIONS', {}))
+            atexit.register(_renderer.close)
+    return _renderer
+
+
+def close_renderer():
+    global _renderer
+    with _renderer_lock:
+        if _renderer is not None:
+            _renderer.close()
+            _renderer = None
+
+
+class RenderError(Exception):
+    pass
+
+
+class BaseRenderer:
+    def render(self, html, options):
+        """
+        Returns the pdf generated from the given html string.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ProcessRenderer(BaseRenderer):
+    """
+    Starts a new wkhtmltopdf process for every document.
+    """
+
+    def render(self, html, options):
+        return pdfkit.from_string(html, False, configuration=_get_pdfkit_config(), options=options)
+
+
+class _WkhtmltopdfProcess:
+    """
+    Long-lived wkhtmltopdf process running in --read-args-from-stdin mode.
+    Every line written to its stdin is a separate conversion and
+    wkhtmltopdf reports the end of each one on stderr.
+    """
+
+    def __init__(self, binary, work_dir):
+        self.jobs_done = 0
+        self.work_dir = work_dir
+        self.process = subprocess.Popen([binary, '--read-args-from-stdin'], stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                        universal_newlines=True, encoding='utf-8')
+        self.output = queue.Queue()
+        self.reader = threading.Thread(target=self._read_output, daemon=True)
+        self.reader.start()
+
+    def _read_output(self):
+        for line in self.process.stderr:
+            self.output.put(line.split('\r')[-1].strip())
+        self.output.put(None)
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def render(self, html, options, timeout):
+        fd, input_path = tempfile.mkstemp(suffix='.html', dir=self.work_dir)
+        output_path = input_path[:-len('.html')] + '.pdf'
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(html)
+            self.process.stdin.write(' '.join(self._get_args(options) + [input_path, output_path]) + '\n')
+            self.process.stdin.flush()
+            self._wait_for_result(timeout)
+            self.jobs_done += 1
+            if not os.path.isfile(output_path) or not os.path.getsize(output_path):
+                raise RenderError('wkhtmltopdf did not produce a document')
+            with open(output_path, 'rb') as f:
+                return f.read()
+        finally:
+            for path in (input_path, output_path):
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def _wait_for_result(self, timeout):
+        while True:
+            try:
+                line = self.output.get(timeout=timeout)
+            except queue.Empty:
+                raise RenderError(f'wkhtmltopdf did not finish within {timeout} seconds')
+            if line is None:
+                raise RenderError('wkhtmltopdf process exited')
+            if line == 'Done':
+                return
+            if line.startswith('Exit with code') or line == 'Failed':
+                return
+
+    @staticmethod
+    def _get_args(options):
+        args = []
+        for key, value in options.items():
+            args.append('--' + key)
+            if value is not None:
+                args.append(str(value))
+        return args
+
+    def close(self):
+        if self.is_alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+class PoolRenderer(BaseRenderer):
+    """
+    Keeps a pool of warmed up wkhtmltopdf processes, so a render does not pay
+    for the process start and font loading. Processes that died, failed a job
+    or finished max_jobs documents are replaced with new ones.
+    """
+
+    def __init__(self, size=2, max_jobs=100, timeout=60, binary=None):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.binary = binary or settings.WKHTMLTOPDF_BINARY
+        self.work_dir = tempfile.mkdtemp(prefix='cv-render-')
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.started = 0
+        self.closed = False
+
+    def _acquire(self):
+        with self.lock:
+            start = self.idle.empty() and self.started < self.size
+            if start:
+                self.started += 1
+        if not start:
+            process = self.idle.get()
+            if process.is_alive():
+                return process
+            process.close()
+        # the process is started without holding the lock, the slot taken above is given back if it fails
+        try:
+            return _WkhtmltopdfProcess(self.binary, self.work_dir)
+        except OSError:
+            with self.lock:
+                self.started -= 1
+            raise
+
+    def _release(self, process, healthy):
+        if healthy and process.is_alive() and process.jobs_done < self.max_jobs and not self.closed:
+            self.idle.put(process)
+            return
+        process.close()
+        with self.lock:
+            self.started -= 1
+
+    def render(self, html, options):
+        process = self._acquire()
+        healthy = False
+        try:
+            pdf = process.render(html, options, self.timeout)
+            healthy = True
+            return pdf
+        except RenderError:
+            logger.warning('Recycling wkhtmltopdf process %s after a failed render', process.process.pid)
+            raise
+        finally:
+            self._release(process, healthy)
+
+    def close(self):
+        self.closed = True
+        while not self.idle.empty():
+            self.idle.get().close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
@@ -0,0 +1,202 @@
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.forms.models import model_to_dict
+from django.utils import timezone
+from .enums import RenderStatus
+from .models import CV
+from .utilities import generate, create_unique_filename, get_render_hash, get_picture_data_uri, get_picture_variant
+
+BASIC_INFO_FIELDS = ['first_name', 'last_name', 'email', 'date_of_birth', 'phone_number']
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+# renders of the same CV are serialized, so the document always reflects the newest data
+_cv_locks = [threading.Lock() for _ in range(32)]
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.CV_RENDER_WORKERS,
+                                           thread_name_prefix='cv-render')
+    return _executor
+
+
+def _get_cv_lock(cv_id):
+    return _cv_locks[hash(str(cv_id)) % len(_cv_locks)]
+
+
+def get_render_data(cv):
+    return {
+        'basic_info': cv.basic_info,
+        'schools': list(cv.schools.order_by('id').values('name', 'date_start', 'date_end', 'additional_info')),
+        'experiences': list(cv.experiences.order_by('id').values('title', 'description', 'date_start', 'date_end')),
+        'skills': list(cv.skills.order_by('id').values('description')),
+        'languages': list(cv.languages.order_by('id').values('name', 'level')),
+    }
+
+
+def get_template_context(data):
+    picture = data['basic_info'].picture
+    picture_src = None
+    if picture:
+        try:
+            picture_path = get_picture_variant(picture.path, 'pdf')
+        except OSError:
+            logger.exception('Creating pdf variant of picture %s failed', picture.name)
+            picture_path = picture.path
+        picture_src = get_picture_data_uri(picture_path)
+    return dict(data, picture_src=picture_src)
+
+
+def get_cv_render_hash(cv, data):
+    basic_info = data['basic_info']
+    serialized_data = dict(data, basic_info=model_to_dict(basic_info, fields=BASIC_INFO_FIELDS))
+    picture_path = basic_info.picture.path if basic_info.picture else None
+    return get_render_hash(serialized_data, cv.template, picture_path)
+
+
+def _is_stored(document):
+    return bool(document) and os.path.isfile(document.path)
+
+
+def _find_rendered_document(render_hash):
+    for cv in CV.objects.filter(render_hash=render_hash, render_status=RenderStatus.READY).only('document'):
+        if _is_stored(cv.document):
+            return cv.document
+    return None
+
+
+def render_cv(cv_id, force=False):
+    """
+    Generates the pdf document of the given CV from its current data
+    and replaces the previous document once the new one is stored.
+    Unless forced, a CV whose document is up to date is skipped.
+    Returns the render status of the CV or None if it does not exist.
+    """
+    with _get_cv_lock(cv_id):
+        try:
+            cv = CV.objects.select_related('basic_info').get(cv_id=cv_id)
+        except CV.DoesNotExist:
+            return None
+
+        data = get_render_data(cv)
+        try:
+            render_hash = get_cv_render_hash(cv, data)
+        except OSError:
+            logger.exception('Computing render hash of CV %s failed', cv_id)
+            render_hash = None
+
+        if not force and render_hash and render_hash == cv.render_hash and _is_stored(cv.document):
+            CV.objects.filter(cv_id=cv_id).update(render_status=RenderStatus.READY)
+            return RenderStatus.READY
+
+        old_path = cv.document.path if cv.document else None
+        new_name = create_unique_filename('cv_docs', 'pdf')
+        rendered_document = _find_rendered_document(render_hash) if render_hash and not force else None
+        if rendered_document:
+            cv.document.name = cv.document.field.generate_filename(cv, new_name)
+            os.makedirs(os.path.dirname(cv.document.path), exist_ok=True)
+            try:
+                shutil.copyfile(rendered_document.path, cv.document.path)
+            except OSError:
+                # the document was removed in the meantime, render it again
+                logger.warning('Copying rendered document %s failed', rendered_document.name)
+                rendered_document = None
+        if not rendered_document:
+            try:
+                pdf = generate(get_template_context(data), cv.template)
+            except Exception:
+                logger.exception('Generating document of CV %s failed', cv_id)
+                CV.objects.filter(cv_id=cv_id).update(render_status=RenderStatus.FAILED)
+                return RenderStatus.FAILED
+            cv.document.save(new_name, ContentFile(pdf), save=False)
+
+        updated = CV.objects.filter(cv_id=cv_id).update(document=cv.document.name,
+                                                        render_status=RenderStatus.READY,
+                                                        render_hash=render_hash)
+        if not updated:
+            cv.document.delete(save=False)
+            return None
+        if old_path and old_path != cv.document.path and os.path.isfile(old_path):
+            os.remove(old_path)
+        return RenderStatus.READY
+
+
+def render_cv_or_fail(cv_id, force=False):
+    """
+    Renders the CV like render_cv, marking it as failed on any error instead of raising,
+    so it is never left pending.
+    """
+    try:
+        return render_cv(cv_id, force=force)
+    except Exception:
+        logger.exception('Rendering CV %s failed', cv_id)
+        CV.objects.filter(cv_id=cv_id).update(render_status=RenderStatus.FAILED)
+        return RenderStatus.FAILED
+
+
+def _run_render_job(cv_id):
+    close_old_connections()
+    try:
+        render_cv_or_fail(cv_id)
+    finally:
+        close_old_connections()
+
+
+def _submit_render(cv_id):
+    if not settings.CV_RENDER_ASYNC:
+        render_cv_or_fail(cv_id)
+        return
+    _get_executor().submit(_run_render_job, cv_id)
+
+
+def _queue_renders(queryset):
+    """
+    Queues renders of the CVs in the executor, so the scheduler thread does not wait for them.
+    The CVs are marked as requested now, so they are not queued again while waiting there.
+    """
+    cv_ids = list(queryset.order_by('date_created').values_list('cv_id', flat=True))
+    CV.objects.filter(cv_id__in=cv_ids).update(render_requested_at=timezone.now())
+    for cv_id in cv_ids:
+        _submit_render(cv_id)
+    return len(cv_ids)
+
+
+def render_pending_cvs():
+    """
+    Renders CVs whose queued render was lost, e.g. when the process was restarted.
+    Only CVs pending for longer than CV_RENDER_PENDING_TIMEOUT seconds are picked up,
+    so renders still waiting in a busy queue are not started twice.
+    Returns the number of queued CVs.
+    """
+    requested_before = timezone.now() - timedelta(seconds=settings.CV_RENDER_PENDING_TIMEOUT)
+    return _queue_renders(CV.objects.filter(render_status=RenderStatus.PENDING)
+                          .filter(Q(render_requested_at=None) | Q(render_requested_at__lt=requested_before)))
+
+
+def retry_failed_cv_renders():
+    return _queue_renders(CV.objects.filter(render_status=RenderStatus.FAILED))
+
+
+def schedule_render(cv):
+    """
+    Queues generation of the CV document. Rendering starts after
+    the current transaction commits, unless CV_RENDER_ASYNC is disabled.
+    """
+    if not settings.CV_RENDER_ASYNC:
+        render_cv_or_fail(cv.cv_id)
+        return
+    cv_id = cv.cv_id
+    transaction.on_commit(lambda: _get_executor().submit(_run_render_job, cv_id))
@@ -1,9 +1,11 @@
 from phonenumber_field.validators import validate_international_phonenumber
 from rest_framework import serializers
-from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
 from .templates.templates import TEMPLATES_CHOICES
 from .utilities import *
 from .models import *
+from .rendering import schedule_render
 import datetime
 
 
@@ -68,6 +70,14 @@ class LanguageSerializer(serializers.ModelSerializer):
         fields = ['name', 'level']
 
 
+CV_SECTIONS = [
+    ('schools', School, SchoolSerializer),
+    ('experiences', Experience, ExperienceSerializer),
+    ('skills', Skill, SkillSerializer),
+    ('languages', Language, LanguageSerializer),
+]
+
+
 class BasicInfoSerializer(serializers.ModelSerializer):
     picture = serializers.ImageField(required=False, write_only=True)
 
@@ -84,6 +94,32 @@ class BasicInfoSerializer(serializers.ModelSerializer):
                   'date_of_birth', 'phone_number', 'picture']
 
         
+class CVListSerializer(serializers.ModelSerializer):
+    """
+    Compact representation of a CV for list views. The "fields" query parameter
+    narrows it down to the given comma separated fields.
+    """
+    user_id = serializers.UUIDField(source='cv_user.user_id', read_only=True)
+    first_name = serializers.CharField(source='basic_info.first_name', read_only=True)
+    last_name = serializers.CharField(source='basic_info.last_name', read_only=True)
+    email = serializers.EmailField(source='basic_info.email', read_only=True)
+
+    class Meta:
+        model = CV
+        fields = ['cv_id', 'name', 'template', 'user_id', 'first_name', 'last_name', 'email', 'date_created',
+                  'is_verified', 'was_reviewed', 'has_picture', 'render_status']
+        read_only_fields = fields
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested_fields = request.query_params.get('fields') if request else None
+        if requested_fields:
+            requested_fields = set(requested_fields.split(','))
+            for field_name in set(self.fields) - requested_fields:
+                self.fields.pop(field_name)
+
+
 class FeedbackSerializer(serializers.ModelSerializer):
     cv_id = serializers.UUIDField()
 
@@ -118,11 +154,12 @@ class CVSerializer(serializers.ModelSerializer):
     is_verified = serializers.BooleanField(default=False, read_only=True)
     was_reviewed = serializers.BooleanField(read_only=True)
     has_picture = serializers.BooleanField(read_only=True)
+    render_status = serializers.CharField(read_only=True)
 
     class Meta:
         model = CV
         fields = ['cv_id', 'template', 'user_id', 'name', 'date_created', 'is_verified', 'was_reviewed', 'has_picture',
-        'cv_user', 'basic_info', 'schools', 'experiences', 'skills', 'languages']
+        'render_status', 'cv_user', 'basic_info', 'schools', 'experiences', 'skills', 'languages']
         
         extra_kwargs = {
             'cv_user': {'required': False, 'write_only': True},
@@ -137,62 +174,60 @@ class CVSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         template = validated_data.pop('template')
-        pdf = generate(validated_data, template)
-        django_file = ContentFile(pdf)
-        django_file.name = create_unique_filename('cv_docs', 'pdf')
         name = None
         if 'name' in validated_data:
             name = validated_data['name']
-        cv = CV.objects.create(cv_user=validated_data['cv_user'],
-                               is_verified=False,
-                               document=django_file,
-                               name=name,
-                               template=template)
-        basic_info_data = validated_data.pop('basic_info')
-        BasicInfo.objects.create(cv=cv, **basic_info_data)
-        return self.create_lists(cv, validated_data)
+        with transaction.atomic():
+            cv = CV.objects.create(cv_user=validated_data['cv_user'],
+                                   is_verified=False,
+                                   name=name,
+                                   template=template,
+                                   render_status=RenderStatus.PENDING,
+                                   render_requested_at=timezone.now())
+            basic_info_data = validated_data.pop('basic_info')
+            BasicInfo.objects.create(cv=cv, **basic_info_data)
+            self.create_lists(cv, validated_data)
+        schedule_render(cv)
+        return cv
 
     def update(self, cv, validated_data):
         basic_info_data = validated_data.get('basic_info')
-        serializer = BasicInfoSerializer()
-        serializer.update(cv.basic_info, basic_info_data)
-        cv.is_verified = False
-        cv.was_reviewed = False
-        School.objects.filter(cv=cv).delete()
-        Experience.objects.filter(cv=cv).delete()
-        Language.objects.filter(cv=cv).delete()
-        Skill.objects.filter(cv=cv).delete()
-        self.create_lists(cv, validated_data)
-        template = validated_data.get('template')
-        validated_data['basic_info'] = cv.basic_info
-        pdf = generate(validated_data, template)
-        django_file = ContentFile(pdf)
-        django_file.name = create_unique_filename('cv_docs', 'pdf')
-        cv.document = django_file
-        cv.save()
+        with transaction.atomic():
+            serializer = BasicInfoSerializer()
+            serializer.update(cv.basic_info, basic_info_data)
+            cv.is_verified = False
+            cv.was_reviewed = False
+            self.update_lists(cv, validated_data)
+            cv.template = validated_data.get('template', cv.template)
+            cv.render_status = RenderStatus.PENDING
+            cv.render_requested_at = timezone.now()
+            cv.save()
+        schedule_render(cv)
         return cv
 
     @staticmethod
-    def create_lists(cv, validated_data):
-        schools_data = validated_data.get('schools')
-        try:
-            experiences_data = validated_data.get('experiences')
-        except KeyError:
-            experiences_data = False
-        skills_data = validated_data.get('skills')
-        languages_data = validated_data.get('languages')
-
-        for data in schools_data:
-            School.objects.create(cv=cv, **data)
-
-        if experiences_data:
-            for data in experiences_data:
-                Experience.objects.create(cv=cv, **data)
-
-        for data in skills_data:
-            Skill.objects.create(cv=cv, **data)
+    def get_section_rows(validated_data, section, serializer_class):
+        fields = serializer_class.Meta.fields
+        return [{field: data.get(field) for field in fields} for data in validated_data.get(section) or []]
 
-        for data in languages_data:
-            Language.objects.create(cv=cv, **data)
+    @staticmethod
+    def create_lists(cv, validated_data):
+        for section, model, serializer_class in CV_SECTIONS:
+            rows = CVSerializer.get_section_rows(validated_data, section, serializer_class)
+            model.objects.bulk_create([model(cv=cv, **data) for data in rows])
+        return cv
 
+    @staticmethod
+    def update_lists(cv, validated_data):
+        """
+        Replaces the entries of the sections whose data changed,
+        the sections that stayed the same are not written at all.
+        """
+        for section, model, serializer_class in CV_SECTIONS:
+            rows = CVSerializer.get_section_rows(validated_data, section, serializer_class)
+            current_rows = list(model.objects.filter(cv=cv).order_by('id').values(*serializer_class.Meta.fields))
+            if rows == current_rows:
+                continue
+            model.objects.filter(cv=cv).delete()
+            model.objects.bulk_create([model(cv=cv, **data) for data in rows])
         return cv
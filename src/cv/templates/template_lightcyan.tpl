@@ -100,7 +100,7 @@
     <body onload="autoSizeText()">
         <header>
             <div>
-                {% if basic_info.picture %}<img class="picture" src="{{"../../usamo" + basic_info.picture.url}}"/>{% endif %}
+                {% if basic_info.picture %}<img class="picture" src="{{picture_src}}"/>{% endif %}
             </div>
             <div id="info">
                 <h1 id="name" class="resize">{{basic_info.first_name | escape}} {{basic_info.last_name | escape}}</h1>
@@ -1,6 +1,8 @@
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from account.account_status import AccountStatus
-from account.models import Account, DefaultAccount, Address
+from account.account_type import AccountType, StaffGroupType
+from account.models import Account, DefaultAccount, Address, StaffAccount
+from django.contrib.auth.models import Group
 from django.contrib.auth.models import User
 from rest_framework import status
 from rest_framework.authtoken.models import Token
@@ -10,9 +12,24 @@ from django.core.files import File
 from cv.models import *
 from cv.cv_test_data import cv_test_data, user_data
 from cv.serializers import CVSerializer
+from cv.enums import RenderStatus
+from cv.rendering import render_cv, render_pending_cvs, retry_failed_cv_renders
+from cv.utilities import generate, get_template_environment, get_picture_variant_path, PICTURE_VARIANTS
+from cv.renderers import PoolRenderer, RenderError
 from rest_framework.test import APIRequestFactory, force_authenticate
-from django.db import models
+from django.db import connection, models
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+from django.core.management import call_command
+from io import BytesIO, StringIO
+from PIL import Image
+import base64
 import os
+import stat
+import sys
+import tempfile
+import threading
 
 
 def create_user(username='testuser', verified=True):
@@ -35,6 +52,14 @@ def create_default(user):
                                          facility_address=address)
 
 
+def create_staff(user):
+    user.type = AccountType.STAFF.value
+    user.save()
+    group, _ = Group.objects.get_or_create(name=StaffGroupType.STAFF_CV.value)
+    user.groups.add(group)
+    return StaffAccount.objects.create(user=user)
+
+
 def create_mock_document():
     mock_file = MagicMock(spec=File)
     mock_file.name = 'TestFileName'
@@ -77,6 +102,17 @@ class CVGeneratorTestCase(APITestCase):
         self.assertEqual(CV.objects.count(), 0)
         self.assertFalse(CV.objects.filter(cv_id=cv_id).exists())
 
+    def test_generate_view_numbers_names(self):
+        self.client.force_authenticate(user=self.user)
+
+        first_response = self.client.post(self.url, cv_test_data, format='json')
+        second_response = self.client.post(self.url, cv_test_data, format='json')
+
+        self.assertEqual(CV.objects.get(cv_id=first_response.data['cv_id']).name, 'test_test_CV_1')
+        self.assertEqual(CV.objects.get(cv_id=second_response.data['cv_id']).name, 'test_test_CV_2')
+        self.default_user.refresh_from_db()
+        self.assertEqual(self.default_user.cv_counter, 2)
+
     def test_generate_view_invalid(self):
         self.client.force_authenticate(user=self.user)
 
@@ -146,3 +182,454 @@ class PictureTestCase(APITestCase):
         self.client.delete(self.url(self.cv.cv_id))
         data2 = CV.objects.get(cv_id=self.cv.cv_id).basic_info
         self.assertFalse(data2.picture)
+
+
+    def test_picture_get_streams_file(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(self.url(self.cv.cv_id), {'picture': self.picture}, format='multipart')
+        content = open('cv/cv_pic.png', 'rb').read()
+
+        response = self.client.get(self.url(self.cv.cv_id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(b''.join(response.streaming_content), content)
+        self.assertIn('Last-Modified', response)
+
+        conditional_response = self.client.get(self.url(self.cv.cv_id), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(conditional_response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        range_response = self.client.get(self.url(self.cv.cv_id), HTTP_RANGE='bytes=0-9')
+        self.assertEqual(range_response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(range_response.content, content[:10])
+        self.assertEqual(range_response['Content-Range'], 'bytes 0-9/%d' % len(content))
+
+        invalid_range_response = self.client.get(self.url(self.cv.cv_id), HTTP_RANGE='bytes=%d-' % len(content))
+        self.assertEqual(invalid_range_response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.client.delete(self.url(self.cv.cv_id))
+
+    def test_picture_get_base64(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(self.url(self.cv.cv_id), {'picture': self.picture}, format='multipart')
+
+        response = self.client.get(self.url(self.cv.cv_id), {'encoding': 'base64'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(base64.b64decode(response.data['file']), open('cv/cv_pic.png', 'rb').read())
+        self.client.delete(self.url(self.cv.cv_id))
+
+
+    def test_picture_variants(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(self.url(self.cv.cv_id), {'picture': self.picture}, format='multipart')
+        picture_path = CV.objects.get(cv_id=self.cv.cv_id).basic_info.picture.path
+        variant_paths = [get_picture_variant_path(picture_path, variant) for variant in PICTURE_VARIANTS]
+        for path in variant_paths:
+            self.assertTrue(os.path.isfile(path))
+
+        response = self.client.get(self.url(self.cv.cv_id), {'variant': 'thumbnail'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        thumbnail = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertLessEqual(thumbnail.width, PICTURE_VARIANTS['thumbnail'][0])
+        self.assertLessEqual(thumbnail.height, PICTURE_VARIANTS['thumbnail'][1])
+
+        response = self.client.get(self.url(self.cv.cv_id), {'variant': 'original'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.delete(self.url(self.cv.cv_id))
+        for path in variant_paths:
+            self.assertFalse(os.path.isfile(path))
+
+    def test_picture_variant_of_corrupt_picture(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(self.url(self.cv.cv_id), {'picture': self.picture}, format='multipart')
+        picture_path = CV.objects.get(cv_id=self.cv.cv_id).basic_info.picture.path
+        for variant in PICTURE_VARIANTS:
+            os.remove(get_picture_variant_path(picture_path, variant))
+        with open(picture_path, 'wb') as picture:
+            picture.write(b'not an image')
+
+        response = self.client.get(self.url(self.cv.cv_id), {'variant': 'thumbnail'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b'not an image')
+
+
+class CVRenderTestCase(APITestCase):
+    @classmethod
+    def setUp(cls):
+        cls.url = '/cv/generator/'
+        cls.url_id = lambda self, id: '/cv/generator/%s/' % id
+        cls.user = create_user()
+        cls.default_user = create_default(cls.user)
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_render_ready(self, generate_mock):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, cv_test_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        cv = CV.objects.get(cv_id=response.data['cv_id'])
+        self.assertEqual(cv.render_status, RenderStatus.READY)
+        self.assertTrue(os.path.isfile(cv.document.path))
+
+        get_response = self.client.get(self.url_id(cv.cv_id))
+        self.assertEqual(get_response.data['render_status'], RenderStatus.READY)
+        self.assertEqual(get_response.data['url'], cv.document.url)
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_render_replaces_previous_document(self, generate_mock):
+        self.client.force_authenticate(user=self.user)
+        cv = create_cv(self.default_user)
+        old_path = CV.objects.get(cv_id=cv.cv_id).document.path
+        edited_data = dict(cv_test_data, skills=[{'description': 'Pływanie'}])
+
+        response = self.client.put('/cv/data/%s/' % cv.cv_id, edited_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        cv = CV.objects.get(cv_id=cv.cv_id)
+        self.assertEqual(cv.render_status, RenderStatus.READY)
+        self.assertNotEqual(cv.document.path, old_path)
+        self.assertFalse(os.path.isfile(old_path))
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_render_skipped_for_unchanged_data(self, generate_mock):
+        self.client.force_authenticate(user=self.user)
+        cv = create_cv(self.default_user)
+        path = CV.objects.get(cv_id=cv.cv_id).document.path
+
+        response = self.client.put('/cv/data/%s/' % cv.cv_id, cv_test_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        cv = CV.objects.get(cv_id=cv.cv_id)
+        self.assertEqual(generate_mock.call_count, 1)
+        self.assertEqual(cv.render_status, RenderStatus.READY)
+        self.assertEqual(cv.document.path, path)
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_render_reuses_identical_document(self, generate_mock):
+        first_cv = CV.objects.get(cv_id=create_cv(self.default_user).cv_id)
+        second_cv = CV.objects.get(cv_id=create_cv(self.default_user).cv_id)
+
+        self.assertEqual(generate_mock.call_count, 1)
+        self.assertEqual(first_cv.render_hash, second_cv.render_hash)
+        self.assertNotEqual(first_cv.document.path, second_cv.document.path)
+        self.assertTrue(os.path.isfile(second_cv.document.path))
+
+    @patch('cv.rendering.generate', side_effect=OSError('No wkhtmltopdf executable found'))
+    def test_render_failed(self, generate_mock):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, cv_test_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        get_response = self.client.get(self.url_id(response.data['cv_id']))
+        self.assertEqual(get_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_response.data['render_status'], RenderStatus.FAILED)
+        self.assertIsNone(get_response.data['url'])
+
+    @patch('cv.rendering.render_cv', side_effect=ValueError)
+    def test_render_error_marks_cv_failed(self, render_mock):
+        cv = create_cv(self.default_user)
+        self.assertEqual(CV.objects.get(cv_id=cv.cv_id).render_status, RenderStatus.FAILED)
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_render_pending_and_failed_cvs(self, generate_mock):
+        pending_cv = create_cv(self.default_user)
+        failed_cv = create_cv(self.default_user)
+        CV.objects.filter(cv_id=pending_cv.cv_id).update(render_status=RenderStatus.PENDING, render_hash=None,
+                                                          render_requested_at=timezone.now())
+        CV.objects.filter(cv_id=failed_cv.cv_id).update(render_status=RenderStatus.FAILED, render_hash=None)
+
+        # a render requested recently may still be waiting in the queue
+        self.assertEqual(render_pending_cvs(), 0)
+        self.assertEqual(CV.objects.get(cv_id=pending_cv.cv_id).render_status, RenderStatus.PENDING)
+
+        CV.objects.filter(cv_id=pending_cv.cv_id).update(
+            render_requested_at=timezone.now() - timedelta(seconds=settings.CV_RENDER_PENDING_TIMEOUT + 1))
+        self.assertEqual(render_pending_cvs(), 1)
+        self.assertEqual(CV.objects.get(cv_id=pending_cv.cv_id).render_status, RenderStatus.READY)
+        self.assertEqual(CV.objects.get(cv_id=failed_cv.cv_id).render_status, RenderStatus.FAILED)
+        self.assertEqual(retry_failed_cv_renders(), 1)
+        self.assertEqual(CV.objects.get(cv_id=failed_cv.cv_id).render_status, RenderStatus.READY)
+
+
+class CVSectionsTestCase(APITestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.default_user = create_default(self.user)
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_create_saves_sections(self, generate_mock):
+        cv = create_cv(self.default_user)
+
+        self.assertEqual(list(cv.schools.order_by('id').values_list('name', flat=True)),
+                         [school['name'] for school in cv_test_data['schools']])
+        self.assertEqual(cv.experiences.count(), len(cv_test_data['experiences']))
+        self.assertEqual(cv.skills.count(), len(cv_test_data['skills']))
+        self.assertEqual(cv.languages.count(), len(cv_test_data['languages']))
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_update_replaces_changed_sections_only(self, generate_mock):
+        self.client.force_authenticate(user=self.user)
+        cv = create_cv(self.default_user)
+        school_ids = list(cv.schools.values_list('id', flat=True))
+        edited_data = dict(cv_test_data, skills=[{'description': 'Pływanie'}], experiences=[])
+
+        response = self.client.put('/cv/data/%s/' % cv.cv_id, edited_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(list(cv.schools.values_list('id', flat=True)), school_ids)
+        self.assertEqual(list(cv.skills.values_list('description', flat=True)), ['Pływanie'])
+        self.assertFalse(cv.experiences.exists())
+
+
+class AdminCVListTestCase(APITestCase):
+    def setUp(self):
+        self.url = '/cv/admin/list/'
+        self.staff_user = create_user('staffuser')
+        create_staff(self.staff_user)
+        self.default_user = create_default(create_user())
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_list_is_full_by_default(self, generate_mock):
+        cv = create_cv(self.default_user)
+        self.client.force_authenticate(user=self.staff_user)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data['results'][0]
+        self.assertEqual(result['cv_id'], str(cv.cv_id))
+        self.assertEqual(result['basic_info']['first_name'], cv_test_data['basic_info']['first_name'])
+        self.assertIn('schools', result)
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_list_is_compact(self, generate_mock):
+        cv = create_cv(self.default_user)
+        self.client.force_authenticate(user=self.staff_user)
+
+        response = self.client.get(self.url, {'compact': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data['results'][0]
+        self.assertEqual(result['cv_id'], str(cv.cv_id))
+        self.assertEqual(result['first_name'], cv_test_data['basic_info']['first_name'])
+        self.assertNotIn('schools', result)
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_list_sparse_fields(self, generate_mock):
+        create_cv(self.default_user)
+        self.client.force_authenticate(user=self.staff_user)
+
+        response = self.client.get(self.url, {'fields': 'cv_id,last_name,unknown'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'cv_id', 'last_name'})
+
+        response = self.client.get('/cv/admin/list/unverified/', {'fields': 'cv_id'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'cv_id'})
+
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_list_search(self, generate_mock):
+        cv = create_cv(self.default_user)
+        other_cv = create_cv(self.default_user)
+        BasicInfo.objects.filter(cv=other_cv).update(first_name='Anna', last_name='Nowak', email='anna@test.com')
+        third_cv = create_cv(self.default_user)
+        BasicInfo.objects.filter(cv=third_cv).update(first_name='Janina', last_name='Nowak', email='janina@test.com')
+        self.client.force_authenticate(user=self.staff_user)
+
+        response = self.client.get(self.url, {'q': 'nowak'})
+        self.assertEqual({result['cv_id'] for result in response.data['results']},
+                         {str(other_cv.cv_id), str(third_cv.cv_id)})
+
+        response = self.client.get(self.url, {'q': 'jan kowal'})
+        self.assertEqual([result['cv_id'] for result in response.data['results']], [str(cv.cv_id)])
+
+        # PostgreSQL ranks by trigram similarity, other databases put prefix matches first, newest first
+        if connection.vendor == 'postgresql':
+            expected = [other_cv, cv, third_cv]
+        else:
+            expected = [other_cv, third_cv, cv]
+        response = self.client.get(self.url, {'q': 'an'})
+        self.assertEqual([result['cv_id'] for result in response.data['results']],
+                         [str(expected_cv.cv_id) for expected_cv in expected])
+
+
+class RerenderCommandTestCase(APITestCase):
+    def setUp(self):
+        self.default_user = create_default(create_user())
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_rerender_filters_by_template(self, generate_mock):
+        cv = create_cv(self.default_user)
+        other_cv = create_cv(self.default_user)
+        CV.objects.filter(cv_id=other_cv.cv_id).update(template='lightblue')
+        generate_mock.reset_mock()
+
+        out = StringIO()
+        call_command('rerender_cvs', '--template', 'bisque', '--force', stdout=out)
+
+        self.assertEqual(generate_mock.call_count, 1)
+        self.assertIn(str(cv.cv_id), out.getvalue())
+        self.assertNotIn(str(other_cv.cv_id), out.getvalue())
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_rerender_continues_after_error(self, generate_mock):
+        cv = create_cv(self.default_user)
+        other_cv = create_cv(self.default_user)
+        original_render_cv = render_cv
+
+        def render_or_raise(cv_id, force=False):
+            if cv_id == cv.cv_id:
+                raise OSError('No space left on device')
+            return original_render_cv(cv_id, force=force)
+
+        out = StringIO()
+        with patch('cv.rendering.render_cv', side_effect=render_or_raise):
+            call_command('rerender_cvs', '--force', stdout=out)
+
+        self.assertIn('1 of 2 CVs ready, 1 failed', out.getvalue())
+        self.assertEqual(CV.objects.get(cv_id=cv.cv_id).render_status, RenderStatus.FAILED)
+        self.assertEqual(CV.objects.get(cv_id=other_cv.cv_id).render_status, RenderStatus.READY)
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_rerender_skips_up_to_date_documents(self, generate_mock):
+        create_cv(self.default_user)
+        generate_mock.reset_mock()
+
+        call_command('rerender_cvs', stdout=StringIO())
+
+        generate_mock.assert_not_called()
+
+    @patch('cv.rendering.generate', return_value=b'%PDF-1.4 test')
+    def test_rerender_force(self, generate_mock):
+        cv = create_cv(self.default_user)
+        old_path = CV.objects.get(cv_id=cv.cv_id).document.path
+        generate_mock.reset_mock()
+
+        call_command('rerender_cvs', '--force', '--unverified', stdout=StringIO())
+
+        cv = CV.objects.get(cv_id=cv.cv_id)
+        self.assertEqual(generate_mock.call_count, 1)
+        self.assertEqual(cv.render_status, RenderStatus.READY)
+        self.assertNotEqual(cv.document.path, old_path)
+        self.assertFalse(os.path.isfile(old_path))
+
+
+class GenerateTestCase(APITestCase):
+    @patch('cv.renderers._get_pdfkit_config')
+    @patch('cv.renderers.pdfkit.from_string', return_value=b'%PDF-1.4 test')
+    def test_generate_pipes_html(self, from_string_mock, config_mock):
+        pdf = generate(cv_test_data, 'bisque')
+
+        self.assertEqual(pdf, b'%PDF-1.4 test')
+        html = from_string_mock.call_args[0][0]
+        self.assertIn('Kowalski', html)
+        self.assertNotIn('class="picture"', html)
+        self.assertFalse(os.path.exists(os.path.join('cv', 'templates', 'generated.html')))
+
+    @patch('cv.renderers._get_pdfkit_config')
+    @patch('cv.renderers.pdfkit.from_string', return_value=b'%PDF-1.4 test')
+    def test_generate_embeds_picture(self, from_string_mock, config_mock):
+        data = dict(cv_test_data, basic_info=dict(cv_test_data['basic_info'], picture=True),
+                    picture_src='data:image/png;base64,AAAA')
+        generate(data, 'lightblue')
+
+        html = from_string_mock.call_args[0][0]
+        self.assertIn('src="data:image/png;base64,AAAA"', html)
+
+    @patch('cv.renderers._get_pdfkit_config')
+    @patch('cv.renderers.pdfkit.from_string', return_value=b'%PDF-1.4 test')
+    def test_generate_reuses_compiled_template(self, from_string_mock, config_mock):
+        env = get_template_environment()
+        template = env.get_template('template_bisque.tpl')
+
+        with patch.object(env, 'compile', wraps=env.compile) as compile_mock:
+            generate(cv_test_data, 'bisque')
+            generate(cv_test_data, 'bisque')
+
+        compile_mock.assert_not_called()
+        self.assertIs(get_template_environment(), env)
+        self.assertIs(env.get_template('template_bisque.tpl'), template)
+
+
+FAKE_WKHTMLTOPDF = """#!{python}
+import os
+import sys
+for line in sys.stdin:
+    args = line.split()
+    if '--fail' in args:
+        sys.stderr.write('Exit with code 1 due to network error: HostNotFoundError\\n')
+    else:
+        with open(args[-1], 'w') as f:
+            f.write('%PDF-1.4 ' + str(os.getpid()))
+        sys.stderr.write('Loading pages (1/6)\\n[======] 100%\\rDone\\n')
+    sys.stderr.flush()
+"""
+
+
+class PoolRendererTestCase(APITestCase):
+    def setUp(self):
+        fd, self.binary = tempfile.mkstemp(suffix='.py')
+        with os.fdopen(fd, 'w') as f:
+            f.write(FAKE_WKHTMLTOPDF.format(python=sys.executable))
+        os.chmod(self.binary, stat.S_IRWXU)
+
+    def tearDown(self):
+        os.remove(self.binary)
+
+    def test_process_is_reused(self):
+        renderer = PoolRenderer(size=1, binary=self.binary, timeout=10)
+        first_pdf = renderer.render('<html></html>', {'page-size': 'Letter'})
+        second_pdf = renderer.render('<html></html>', {'page-size': 'Letter'})
+        renderer.close()
+
+        self.assertTrue(first_pdf.startswith(b'%PDF'))
+        self.assertEqual(first_pdf, second_pdf)
+
+    def test_process_is_recycled_after_max_jobs(self):
+        renderer = PoolRenderer(size=1, max_jobs=1, binary=self.binary, timeout=10)
+        first_pdf = renderer.render('<html></html>', {})
+        second_pdf = renderer.render('<html></html>', {})
+        renderer.close()
+
+        self.assertNotEqual(first_pdf, second_pdf)
+
+    def test_failed_render_replaces_process(self):
+        renderer = PoolRenderer(size=1, binary=self.binary, timeout=10)
+        first_pdf = renderer.render('<html></html>', {})
+        self.assertRaises(RenderError, lambda: renderer.render('<html></html>', {'fail': None}))
+        second_pdf = renderer.render('<html></html>', {})
+        renderer.close()
+
+        self.assertNotEqual(first_pdf, second_pdf)
+
+    def test_dead_process_is_replaced(self):
+        renderer = PoolRenderer(size=1, binary=self.binary, timeout=10)
+        renderer.render('<html></html>', {})
+        process = renderer.idle.get()
+        process.process.kill()
+        process.process.wait()
+        renderer.idle.put(process)
+
+        self.assertTrue(renderer.render('<html></html>', {}).startswith(b'%PDF'))
+        renderer.close()
+
+    def test_failed_process_start_frees_the_slot(self):
+        renderer = PoolRenderer(size=1, binary=os.path.join(tempfile.gettempdir(), 'nonexistent-wkhtmltopdf'))
+        errors = []
+
+        def render():
+            for i in range(2):
+                try:
+                    renderer.render('<html></html>', {})
+                except OSError as e:
+                    errors.append(e)
+
+        thread = threading.Thread(target=render, daemon=True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(renderer.started, 0)
+
+        renderer.binary = self.binary
+        self.assertTrue(renderer.render('<html></html>', {}).startswith(b'%PDF'))
+        renderer.close()
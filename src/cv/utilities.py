@@ -1,19 +1,40 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.crypto import get_random_string
 from rest_framework import serializers
 from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+import base64
+import hashlib
+import json
+import mimetypes
 import os
 import random
+import re
 import datetime
 import jinja2
-import pdfkit
+import logging
 import platform
-import io
 import sys
+import tempfile
+import threading
+from PIL import Image, ImageOps
+from .renderers import get_renderer
 from .templates.templates import TEMPLATES_CHOICES
 
+logger = logging.getLogger(__name__)
 
-def _get_pdfkit_config():
-    return pdfkit.configuration(wkhtmltopdf=settings.WKHTMLTOPDF_BINARY)
+# largest width and height of every picture variant, the pdf one fits the picture box of the templates
+PICTURE_VARIANTS = {
+    'pdf': (400, 500),
+    'thumbnail': (150, 150),
+}
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+_template_env = None
+_template_env_lock = threading.Lock()
 
 
 def create_unique_filename(prefix, ext):
@@ -37,10 +58,186 @@ def create_unique_filename(prefix, ext):
     return unique_filename
 
 
-def generate(data, template):
+def get_template_environment():
+    """
+    Returns the process-wide jinja environment of the CV templates. Compiled templates
+    are kept in memory and in a bytecode cache shared by all workers, a template
+    is compiled again only when its file changes.
+    """
+    global _template_env
+    with _template_env_lock:
+        if _template_env is None:
+            cache_dir = settings.CV_TEMPLATES_CACHE_DIR
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            _template_env = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(TEMPLATES_DIR),
+                bytecode_cache=jinja2.FileSystemBytecodeCache(cache_dir),
+                auto_reload=True
+            )
+    return _template_env
+
+
+def precompile_templates():
+    env = get_template_environment()
+    for name, filename in TEMPLATES_CHOICES:
+        env.get_template(filename)
+
+
+def get_template_filename(template):
     template_filename = next((filename for (name, filename) in TEMPLATES_CHOICES if name == template), None)
     if not template_filename:
         raise serializers.ValidationError("Not valid template name")
+    return template_filename
+
+
+def get_file_checksum(file_path, chunk_size=64 * 1024):
+    checksum = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def get_picture_data_uri(file_path):
+    content_type = mimetypes.guess_type(file_path)[0] or 'image/png'
+    with open(file_path, 'rb') as f:
+        encoded_picture = base64.b64encode(f.read()).decode('ascii')
+    return f'data:{content_type};base64,{encoded_picture}'
+
+
+def get_file_etag(stat_result):
+    return quote_etag(f'{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}')
+
+
+def get_byte_range(range_header, size):
+    """
+    Returns the (start, end) pair of a single range "bytes=" header, both inclusive,
+    None when the range can not be satisfied or False when the header is not supported.
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header.strip())
+    if not match or match.groups() == ('', ''):
+        return False
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+
+def get_file_response(request, file_path):
+    """
+    Streams the file with its validators, answers conditional requests
+    with 304 and single byte range requests with 206.
+    """
+    stat_result = os.stat(file_path)
+    etag = get_file_etag(stat_result)
+    last_modified = int(stat_result.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+    size = stat_result.st_size
+    byte_range = False
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or if_range == etag):
+        byte_range = get_byte_range(range_header, size)
+
+    if byte_range is None:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range:
+        start, end = byte_range
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            response = HttpResponse(f.read(end - start + 1), content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def get_picture_variant_path(picture_path, variant):
+    root, ext = os.path.splitext(picture_path)
+    return f'{root}_{variant}.jpg'
+
+
+def create_picture_variant(picture_path, variant):
+    """
+    Stores a copy of the picture scaled down to fit the variant size, with the exif
+    orientation applied and the transparency flattened onto a white background.
+    """
+    variant_path = get_picture_variant_path(picture_path, variant)
+    with Image.open(picture_path) as picture:
+        picture = ImageOps.exif_transpose(picture)
+        picture.thumbnail(PICTURE_VARIANTS[variant], Image.LANCZOS)
+        if picture.mode in ('RGBA', 'LA') or (picture.mode == 'P' and 'transparency' in picture.info):
+            picture = picture.convert('RGBA')
+            background = Image.new('RGB', picture.size, 'white')
+            background.paste(picture, mask=picture.split()[-1])
+            picture = background
+        else:
+            picture = picture.convert('RGB')
+        # written under a temporary name, so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(suffix='.jpg', dir=os.path.dirname(picture_path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                picture.save(f, 'JPEG', quality=85, optimize=True)
+            os.replace(tmp_path, variant_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return variant_path
+
+
+def get_picture_variant(picture_path, variant):
+    """
+    Returns the path of the picture variant, creating it when it is not stored yet.
+    """
+    variant_path = get_picture_variant_path(picture_path, variant)
+    if os.path.isfile(variant_path) and os.path.getmtime(variant_path) >= os.path.getmtime(picture_path):
+        return variant_path
+    return create_picture_variant(picture_path, variant)
+
+
+def create_picture_variants(picture_path):
+    for variant in PICTURE_VARIANTS:
+        get_picture_variant(picture_path, variant)
+
+
+def delete_picture_variants(picture_path):
+    for variant in PICTURE_VARIANTS:
+        variant_path = get_picture_variant_path(picture_path, variant)
+        if os.path.isfile(variant_path):
+            os.remove(variant_path)
+
+
+def get_render_hash(data, template, picture_path=None):
+    """
+    Returns a hash of everything that affects the generated document:
+    the template and its modification time, the serialized CV data and the picture.
+    """
+    template_path = os.path.join(TEMPLATES_DIR, get_template_filename(template))
+    render_hash = hashlib.sha256()
+    render_hash.update(template.encode('utf-8'))
+    render_hash.update(str(os.path.getmtime(template_path)).encode('utf-8'))
+    render_hash.update(json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder).encode('utf-8'))
+    if picture_path:
+        render_hash.update(get_file_checksum(picture_path).encode('utf-8'))
+    return render_hash.hexdigest()
+
+
+def generate(data, template):
+    template_filename = get_template_filename(template)
 
     # options for the pdf
     options = {
@@ -51,22 +248,11 @@ def generate(data, template):
         'margin-left': '0in'
     }
 
-    # get paths
-    module_dir = os.path.dirname(__file__)
-    template_path = os.path.join(module_dir, 'templates/')
-    html_path = os.path.join(module_dir, 'templates/generated.html')
-    # get data and jinja
-    env = jinja2.environment.Environment(
-        loader=jinja2.FileSystemLoader(template_path)
-    )
-
-    # generate html and pdf
-    template = env.get_template(template_filename)
-    with io.open(html_path, "w", encoding="utf-8") as f:
-        f.write(template.render(**data))
+    # generate html and pdf, the html is handed to the renderer so renders do not share any files
+    template = get_template_environment().get_template(template_filename)
+    html = template.render(**data)
     if platform.system() != 'Windows':
         options['zoom'] = '0.78125'
-    pdf = pdfkit.from_file(
-        html_path, False, configuration=_get_pdfkit_config(), options=options)
+    pdf = get_renderer().render(html, options)
     # right now it returns the pdf
     return pdf
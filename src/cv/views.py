@@ -16,10 +16,13 @@ from .filters import CvOrderingFilter, CVListFilter, DjangoFilterDescriptionInsp
 from .models import *
 from .serializers import *
 from .templates.templates import *
-from job.views import sample_message_response, ErrorResponse, MessageResponse
+from job.views import ErrorResponse, MessageResponse
 import base64
+import logging
 from notifications.signals import notify
 
+logger = logging.getLogger(__name__)
+
 
 class CVPagination(PageNumberPagination):
     page_size = 10
@@ -74,11 +77,13 @@ class CVView(views.APIView):
                               description='String UUID będący id danego CV')
         ],
         responses={
-            '200': sample_message_response("/media/cv_docs/2020/04/03/file_name.pdf"),
+            '200': '"url": "/media/cv_docs/2020/04/03/file_name.pdf", "render_status": pending/ready/failed',
             '403': 'Nie masz uprawnień do wykonania tej czynności',
             '404': "Nie znaleziono CV. Upewnij się, że uwzględniono cv_id w url-u"
         },
-        operation_description='Zwraca url-a do pdf zawierającego CV na podstawie zapisanych wcześniej danych'
+        operation_description='Zwraca url-a do pdf zawierającego CV na podstawie zapisanych wcześniej danych '
+                              'oraz status jego generowania. Dopóki pdf nie zostanie wygenerowany, url wskazuje na '
+                              'poprzednią wersję dokumentu lub jest pusty'
     )
     def get(self, request, cv_id):
         try:
@@ -89,7 +94,8 @@ class CVView(views.APIView):
         except CV.DoesNotExist:
             return ErrorResponse("Nie znaleziono CV. Upewnij się, że uwzględniono cv_id w url-u", status.HTTP_404_NOT_FOUND)
 
-        return Response({'url': cv.document.url}, status.HTTP_200_OK)
+        url = cv.document.url if cv.document else None
+        return Response({'url': url, 'render_status': cv.render_status}, status.HTTP_200_OK)
 
     @swagger_auto_schema(
         operation_description="Usuwa CV z bazy danych jeśli ono istnieje",
@@ -164,8 +170,6 @@ class CVDataView(views.APIView):
             return ErrorResponse("Nie znaleziono cv", status.HTTP_404_NOT_FOUND)
         serializer = CVSerializer(data=request.data)
 
-        delete_previous_cv_file(cv)
-
         if serializer.is_valid():
             serializer.update(cv, serializer.validated_data)
         else:
@@ -225,25 +229,40 @@ class CVPictureView(views.APIView):
             ErrorResponse('Upewnij się, że form key to "picture"', status.HTTP_400_BAD_REQUEST)
         serializer = CVSerializer(data=data)
 
-        delete_previous_cv_file(cv)
         delete_previous_picture(cv.basic_info)
 
         if serializer.is_valid():
             serializer.update(cv, serializer.validated_data)
+            picture = cv.basic_info.picture
+            if picture:
+                try:
+                    create_picture_variants(picture.path)
+                except OSError:
+                    logger.exception('Creating variants of picture %s failed', picture.name)
             return MessageResponse('Zdjęcie dodano pomyślnie')
         else:
             return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
     @swagger_auto_schema(
-        operation_description="Zwraca obrazek w base64",
+        operation_description="Zwraca plik ze zdjęciem. Obsługuje zapytania warunkowe (ETag, Last-Modified) "
+                              "i zakresy bajtów (Range). Z parametrem encoding=base64 zwraca obrazek w base64",
         manual_parameters=[
             openapi.Parameter('cv_id', openapi.IN_PATH, type='string($uuid)',
-                              description='String UUID będący id danego CV')
+                              description='String UUID będący id danego CV'),
+            openapi.Parameter('variant', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              enum=list(PICTURE_VARIANTS),
+                              description='Zwraca pomniejszoną wersję zdjęcia zamiast oryginału'),
+            openapi.Parameter('encoding', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['base64'],
+                              description='Zwraca obrazek w base64 w polu "file"')
         ],
         responses={
-            '200': "file: base 64",
+            '200': "Plik ze zdjęciem / file: base 64",
+            '206': "Fragment pliku ze zdjęciem",
+            '304': "Zdjęcie nie zmieniło się",
+            '400': "Niepoprawna wersja zdjęcia",
             '403': "Nie masz uprawnień do wykonania tej czynności",
-            '404': 'Nie znaleziono CV/zdjęcia'
+            '404': 'Nie znaleziono CV/zdjęcia',
+            '416': 'Niepoprawny zakres bajtów'
         }
     )
     def get(self, request, cv_id):
@@ -255,14 +274,27 @@ class CVPictureView(views.APIView):
         except CV.DoesNotExist:
             return ErrorResponse('Nie znaleziono CV', status.HTTP_404_NOT_FOUND)
         bi = BasicInfo.objects.get(cv=cv)
-        if not bi.picture:
+        if not bi.picture or not os.path.isfile(bi.picture.path):
             return ErrorResponse('Nie znaleziono zdjęcia', status.HTTP_404_NOT_FOUND)
 
-        encoded_string = base64.b64encode(bi.picture.read())
+        picture_path = bi.picture.path
+        variant = request.query_params.get('variant')
+        if variant:
+            if variant not in PICTURE_VARIANTS:
+                return ErrorResponse('Niepoprawna wersja zdjęcia', status.HTTP_400_BAD_REQUEST)
+            try:
+                picture_path = get_picture_variant(picture_path, variant)
+            except OSError:
+                # e.g. an upload Pillow cannot read, the original is served instead
+                logger.exception('Creating %s variant of picture %s failed', variant, bi.picture.name)
 
-        response_data = {'file': encoded_string}
+        if request.query_params.get('encoding') == 'base64':
+            with open(picture_path, 'rb') as picture:
+                encoded_string = base64.b64encode(picture.read())
+            response_data = {'file': encoded_string}
+            return Response(response_data, status.HTTP_200_OK)
 
-        return Response(response_data, status.HTTP_200_OK)
+        return get_file_response(request, picture_path)
 
     @swagger_auto_schema(
         operation_description="Usuwa CV z bazy",
@@ -286,24 +318,39 @@ class CVPictureView(views.APIView):
         bi = BasicInfo.objects.get(cv=cv)
         if not bi.picture:
             return ErrorResponse('Nie znaleziono zdjęcia', status.HTTP_404_NOT_FOUND)
+        delete_picture_variants(bi.picture.path)
         bi.picture.delete(save=True)
         cv.has_picture = False
         cv.save()
         cv_serializer = CVSerializer(instance=cv)
 
         delete_previous_picture(bi)
-        delete_previous_cv_file(cv)
         cv_serializer.update(cv, cv_serializer.data)
 
         return MessageResponse('Zdjęcie usunięto pomyślnie')
 
 
+def is_compact_cv_list(request):
+    """Admin CV lists serve CVListSerializer rows only when asked to with ?compact=1 or ?fields=."""
+    if request is None:
+        return False
+    params = request.query_params
+    return params.get('compact', '').lower() in ('1', 'true') or bool(params.get('fields'))
+
+
 @method_decorator(name='get', decorator=swagger_auto_schema(
     filter_inspectors=[DjangoFilterDescriptionInspector],
     responses={
         '403': "User has no permission to perform this action.",
         '404': "Not found"
     },
+    manual_parameters=[
+        openapi.Parameter('compact', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                          description='Zwraca skróconą, płaską reprezentację CV zamiast pełnej'),
+        openapi.Parameter('fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                          description='Lista pól skróconej reprezentacji oddzielonych przecinkami, '
+                                      'np. "cv_id,first_name,last_name". Podanie jej włącza tryb skrócony')
+    ],
     operation_description="Zwraca listę niezweryfikowanych CV dla admina"
 ))
 class AdminUnverifiedCVList(generics.ListAPIView):
@@ -316,15 +363,20 @@ class AdminUnverifiedCVList(generics.ListAPIView):
                        'was_reviewed']
     ordering = ['-date_created']
 
+    def get_serializer_class(self):
+        return CVListSerializer if is_compact_cv_list(self.request) else CVSerializer
+
     def get_queryset(self):
-        return CV.objects\
+        queryset = CV.objects\
             .select_related('cv_user') \
-            .select_related('basic_info') \
-            .prefetch_related('schools') \
-            .prefetch_related('experiences') \
-            .prefetch_related('skills') \
-            .prefetch_related('languages') \
-            .filter(is_verified=False)
+            .select_related('basic_info')
+        if not is_compact_cv_list(self.request):
+            queryset = queryset \
+                .prefetch_related('schools') \
+                .prefetch_related('experiences') \
+                .prefetch_related('skills') \
+                .prefetch_related('languages')
+        return queryset.filter(is_verified=False)
 
 
 class AdminFeedback(views.APIView):
@@ -460,6 +512,13 @@ class CVStatus(views.APIView):
         '403': "Nie masz uprawnień, by wykonać tę czynność.",
         '404': "Not found",
     },
+    manual_parameters=[
+        openapi.Parameter('compact', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                          description='Zwraca skróconą, płaską reprezentację CV zamiast pełnej'),
+        openapi.Parameter('fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                          description='Lista pól skróconej reprezentacji oddzielonych przecinkami, '
+                                      'np. "cv_id,first_name,last_name". Podanie jej włącza tryb skrócony')
+    ],
     operation_description="Zwraca listę wszystkich CV dla admina"
 ))
 class AdminCVListView(generics.ListAPIView):
@@ -472,15 +531,20 @@ class AdminCVListView(generics.ListAPIView):
                        'was_reviewed', 'is_verified']
     ordering = ['-date_created']
 
+    def get_serializer_class(self):
+        return CVListSerializer if is_compact_cv_list(self.request) else CVSerializer
+
     def get_queryset(self):
-        return CV.objects\
+        queryset = CV.objects\
             .select_related('cv_user') \
-            .select_related('basic_info') \
-            .prefetch_related('schools') \
-            .prefetch_related('experiences') \
-            .prefetch_related('skills') \
-            .prefetch_related('languages') \
-            .all()
+            .select_related('basic_info')
+        if not is_compact_cv_list(self.request):
+            queryset = queryset \
+                .prefetch_related('schools') \
+                .prefetch_related('experiences') \
+                .prefetch_related('skills') \
+                .prefetch_related('languages')
+        return queryset.all()
 
 @method_decorator(name='get', decorator=swagger_auto_schema(
     filter_inspectors=[DjangoFilterDescriptionInspector],
@@ -0,0 +1,128 @@
+import hashlib
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import urlencode
+
+VERSION_KEY = 'job_offer_list:version'
+DICTIONARY_TIMEOUT = 24 * 60 * 60
+CATEGORIES_DICTIONARY = 'categories'
+OFFER_TYPES_DICTIONARY = 'offer_types'
+
+# key: (version, expiry) of the versions read from the shared cache by this process
+_local_versions = {}
+# name: (version, data) of the dictionaries used by this process
+_local_dictionaries = {}
+
+
+def _get_cache():
+    return caches[settings.JOB_OFFER_LIST_CACHE['ALIAS']]
+
+
+def _remember_version(key, version):
+    _local_versions[key] = (version, time.monotonic() + settings.JOB_OFFER_LIST_CACHE['LOCAL_VERSION_TIMEOUT'])
+
+
+def _get_version(key):
+    """
+    Returns the current version of the key. The version is read from the shared cache at most
+    once per LOCAL_VERSION_TIMEOUT seconds, so changes made by other processes are seen
+    after up to that time. Changes made by this process are seen at once.
+    """
+    local = _local_versions.get(key)
+    if local and local[1] > time.monotonic():
+        return local[0]
+    cache = _get_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    _remember_version(key, version)
+    return version
+
+
+def _bump_version(key):
+    version = uuid.uuid4().hex
+    _get_cache().set(key, version, None)
+    _remember_version(key, version)
+
+
+def _invalidate(key):
+    # the version is changed again after the current transaction commits,
+    # so data cached before the changes were visible is dropped as well
+    _bump_version(key)
+    transaction.on_commit(lambda: _bump_version(key))
+
+
+def get_job_offer_list_version():
+    return _get_version(VERSION_KEY)
+
+
+def invalidate_job_offer_list():
+    """
+    Makes all cached job offer lists stale.
+    """
+    _invalidate(VERSION_KEY)
+
+
+def _get_dictionary_version_key(name):
+    return f'job_dictionary:{name}:version'
+
+
+def get_dictionary(name, load):
+    """
+    Returns the ETag and the data of the named dictionary, e.g. the list of categories.
+    The data is kept in the shared cache and in this process under the current version,
+    so while the version is remembered locally no query is made, and after that only the version is read.
+    load is called when neither has the data.
+    """
+    version = _get_version(_get_dictionary_version_key(name))
+    etag = f'"{name}-{version}"'
+    local = _local_dictionaries.get(name)
+    if local and local[0] == version:
+        return etag, local[1]
+
+    key = f'job_dictionary:{name}:{version}'
+    data = _get_cache().get(key)
+    if data is None:
+        data = load()
+        _get_cache().set(key, data, DICTIONARY_TIMEOUT)
+    _local_dictionaries[name] = (version, data)
+    return etag, data
+
+
+def invalidate_dictionary(name):
+    _invalidate(_get_dictionary_version_key(name))
+
+
+def clear_local_cache():
+    """
+    Forgets the versions and dictionaries kept by this process, e.g. after the shared cache is cleared.
+    """
+    _local_versions.clear()
+    _local_dictionaries.clear()
+
+
+def get_job_offer_list_cache_key(request):
+    """
+    Returns the cache key of the list for the request. Parameters are normalized,
+    so their order and the order of repeated values do not matter. The list version
+    is usually remembered by the process, so a cached list costs a single query.
+    """
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists() if any(values))
+    params_hash = hashlib.sha1(urlencode(params, doseq=True).encode('utf-8')).hexdigest()
+    return f'job_offer_list:{get_job_offer_list_version()}:{request.scheme}:{request.get_host()}:{params_hash}'
+
+
+def get_cached_job_offer_list(key):
+    return _get_cache().get(key)
+
+
+def cache_job_offer_list(key, data):
+    # storing costs a few queries of the database cache (it counts and culls old entries), which is paid
+    # once per list and version, every later request for the list is one query instead of the count and the page
+    # the key is computed before the list is built, so a list built during an invalidation is stored
+    # under the old version and never served
+    _get_cache().set(key, data, settings.JOB_OFFER_LIST_CACHE['TIMEOUT'])
@@ -24,7 +24,17 @@ class DjangoFilterDescriptionInspector(CoreAPICompatInspector):
 
 class JobOfferOrderingFilter(OrderingFilter):
     ordering_description = "ordering by: offer_name, category, voivodeship, salary_min, salary_max, company_name, " \
-                           "expiration_date"
+                           "expiration_date. Search results are ordered by relevance by default"
+
+    def filter_queryset(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get(self.ordering_param):
+            return queryset
+        return super().filter_queryset(request, queryset, view)
+
+
+class EmployerJobOfferOrderingFilter(JobOfferOrderingFilter):
+    ordering_description = "ordering by: offer_name, category, voivodeship, salary_min, salary_max, company_name, " \
+                           "expiration_date, applications_count, unread_count"
 
 
 class JobOfferApplicationListFilter(filters.FilterSet):
@@ -0,0 +1,102 @@
+import random
+import time
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from account.models import Address
+from job.enums import Voivodeships
+from job.models import JobOffer, JobOfferCategory, JobOfferType
+
+
+class Command(BaseCommand):
+    help = 'Creates a synthetic set of job offers and compares the query plans of the job offer listing ' \
+           'and archiving with and without the job offer indexes. All changes are rolled back, but dropping ' \
+           'the indexes holds an ACCESS EXCLUSIVE lock on the job offer table until the run ends, blocking ' \
+           'every read and write of job offers. Only runs with DEBUG on or with --i-know-this-locks-the-table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offers', type=int, default=100000, help='Number of generated offers')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Run EXPLAIN ANALYZE on PostgreSQL, executing the queries')
+        parser.add_argument('--i-know-this-locks-the-table', action='store_true', dest='locks_table',
+                            help='Run even though DEBUG is off. The job offer table stays locked '
+                                 'for the whole run, never use it on a live database')
+
+    def get_queries(self, category, offer_type):
+        today = date.today()
+        active = JobOffer.objects.filter(removed=False, confirmed=True)
+        return [
+            ('listing', active.order_by('expiration_date', 'id')[:10]),
+            ('listing by voivodeship', active.filter(voivodeship='mazowieckie').order_by('expiration_date')[:10]),
+            ('listing by category', active.filter(category__in=[category]).order_by('expiration_date')[:10]),
+            ('listing by type', active.filter(offer_type__in=[offer_type]).order_by('expiration_date')[:10]),
+            ('listing by expiration date', active.filter(expiration_date__gte=today).order_by('expiration_date')[:10]),
+            ('archiving', JobOffer.objects.filter(removed=False, expiration_date__lt=today).only('id')),
+        ]
+
+    def create_offers(self, count, categories, offer_types):
+        voivodeships = [key for key, name in Voivodeships.choices]
+        today = date.today()
+        first_address_id = (Address.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        batch_size = 5000
+        for start in range(0, count, batch_size):
+            size = min(batch_size, count - start)
+            # ids are given explicitly, bulk_create does not return them on every database
+            addresses = [Address(id=first_address_id + start + i, city='Warszawa', street='Testowa',
+                                 street_number='1', postal_code='00-001') for i in range(size)]
+            Address.objects.bulk_create(addresses)
+            offers = []
+            for address in addresses:
+                # most offers are archived or waiting for confirmation, like in production
+                removed = random.random() < 0.7
+                offers.append(JobOffer(
+                    offer_name='Oferta testowa',
+                    category=random.choice(categories),
+                    offer_type=random.choice(offer_types),
+                    salary_min=1000,
+                    salary_max=3000,
+                    company_name='Firma testowa',
+                    company_address=address,
+                    voivodeship=random.choice(voivodeships),
+                    expiration_date=today + timedelta(days=random.randint(-700, 90)),
+                    description='Opis oferty',
+                    removed=removed,
+                    confirmed=removed or random.random() < 0.9
+                ))
+            JobOffer.objects.bulk_create(offers)
+
+    def explain(self, queryset, analyze):
+        options = {'analyze': True} if analyze and connection.vendor == 'postgresql' else {}
+        started = time.perf_counter()
+        plan = queryset.explain(**options)
+        return plan, time.perf_counter() - started
+
+    def write_plans(self, title, queries, analyze):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for label, queryset in queries:
+            plan, duration = self.explain(queryset, analyze)
+            self.stdout.write(self.style.MIGRATE_LABEL(f'{label} ({duration * 1000:.1f} ms)'))
+            self.stdout.write(plan)
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['locks_table']:
+            raise CommandError('The benchmark locks the job offer table for the whole run. '
+                               'Run it with DEBUG on or pass --i-know-this-locks-the-table.')
+        with transaction.atomic():
+            categories = [JobOfferCategory.objects.get_or_create(name=f'benchmark {i}')[0] for i in range(10)]
+            offer_types = [JobOfferType.objects.get_or_create(name=f'benchmark {i}')[0] for i in range(3)]
+            self.stdout.write(f'Creating {options["offers"]} job offers...')
+            self.create_offers(options['offers'], categories, offer_types)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            queries = self.get_queries(categories[0], offer_types[0])
+            self.write_plans('With indexes', queries, options['analyze'])
+            with connection.cursor() as cursor:
+                for index in JobOffer._meta.indexes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+                cursor.execute('ANALYZE')
+            self.write_plans('Without indexes', queries, options['analyze'])
+
+            transaction.set_rollback(True)
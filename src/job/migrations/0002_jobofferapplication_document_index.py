@@ -0,0 +1,18 @@
+# Generated by Django 2.2.10 on 2026-10-18 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='jobofferapplication',
+            name='document',
+            field=models.FileField(db_index=True, null=True, upload_to='application_docs/'),
+        ),
+    ]
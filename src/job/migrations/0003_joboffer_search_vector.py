@@ -0,0 +1,40 @@
+# Generated by Django 2.2.10 on 2026-10-18 08:04
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS job_joboffer_search_vector_gin '
+                          'ON job_joboffer USING gin (search_vector)')
+    JobOffer = apps.get_model('job', 'JobOffer')
+    config = settings.JOB_OFFER_SEARCH_CONFIG
+    JobOffer.objects.update(search_vector=SearchVector('offer_name', weight='A', config=config) +
+                            SearchVector('company_name', weight='B', config=config) +
+                            SearchVector('description', weight='C', config=config))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS job_joboffer_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job', '0002_jobofferapplication_document_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='joboffer',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
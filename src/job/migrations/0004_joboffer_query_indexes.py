@@ -0,0 +1,33 @@
+# Generated by Django 2.2.10 on 2026-10-18 08:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job', '0003_joboffer_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='joboffer',
+            index=models.Index(condition=models.Q(('confirmed', True), ('removed', False)), fields=['expiration_date', 'id'], name='job_offer_active_exp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='joboffer',
+            index=models.Index(condition=models.Q(('confirmed', True), ('removed', False)), fields=['voivodeship', 'expiration_date'], name='job_offer_active_voiv_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='joboffer',
+            index=models.Index(condition=models.Q(('confirmed', True), ('removed', False)), fields=['category', 'expiration_date'], name='job_offer_active_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='joboffer',
+            index=models.Index(condition=models.Q(('confirmed', True), ('removed', False)), fields=['offer_type', 'expiration_date'], name='job_offer_active_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='joboffer',
+            index=models.Index(condition=models.Q(removed=False), fields=['expiration_date'], name='job_offer_not_removed_exp_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.10 on 2026-10-18 08:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def init_application_counters(apps, schema_editor):
+    JobOffer = apps.get_model('job', 'JobOffer')
+    JobOfferApplication = apps.get_model('job', 'JobOfferApplication')
+    counts = JobOfferApplication.objects.filter(job_offer=OuterRef('pk')).order_by().values('job_offer')
+    JobOffer.objects.update(
+        applications_count=Coalesce(Subquery(counts.annotate(count=Count('id')).values('count'),
+                                             output_field=models.IntegerField()), 0),
+        unread_count=Coalesce(Subquery(counts.annotate(count=Count('id', filter=Q(was_read=False))).values('count'),
+                                       output_field=models.IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job', '0004_joboffer_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='joboffer',
+            name='applications_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='joboffer',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(init_application_counters, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,14 @@
 import os
+import shutil
+import tempfile
 import uuid
-from datetime import datetime
 from zipfile import ZipFile
 from django.contrib.auth.models import User
-from django.core.files.base import ContentFile
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import SET_NULL
+from django.db import connections, models, transaction
+from django.db.models import Count, F, OuterRef, Q, SET_NULL, Subquery
+from django.db.models.functions import Coalesce
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.conf import settings
@@ -14,7 +16,10 @@ from .enums import Voivodeships
 from .utils import create_job_offer_image_path
 from account.models import DefaultAccount, EmployerAccount, Address
 from cv.models import CV
+from cv.utilities import get_file_checksum
 from job.jobs import delete_zip_file
+from job.cache import invalidate_job_offer_list, get_dictionary, invalidate_dictionary, CATEGORIES_DICTIONARY, \
+    OFFER_TYPES_DICTIONARY
 
 
 class JobOfferCategory(models.Model):
@@ -42,31 +47,75 @@ class JobOffer(models.Model):
     confirmed = models.BooleanField(default=False)
     employer = models.ForeignKey(EmployerAccount, on_delete=models.SET_NULL, null=True, default=None)
     zip_file = models.URLField(null=True)
+    # filled on PostgreSQL only, see update_search_vector
+    search_vector = SearchVectorField(null=True, editable=False)
+    # maintained by the application receivers and set_applications_read
+    applications_count = models.PositiveIntegerField(editable=False, default=0)
+    unread_count = models.PositiveIntegerField(editable=False, default=0)
+
+    class Meta:
+        indexes = [
+            # public listing of active offers, ordered by expiration date
+            models.Index(fields=['expiration_date', 'id'], name='job_offer_active_exp_idx',
+                         condition=Q(removed=False, confirmed=True)),
+            models.Index(fields=['voivodeship', 'expiration_date'], name='job_offer_active_voiv_idx',
+                         condition=Q(removed=False, confirmed=True)),
+            models.Index(fields=['category', 'expiration_date'], name='job_offer_active_cat_idx',
+                         condition=Q(removed=False, confirmed=True)),
+            models.Index(fields=['offer_type', 'expiration_date'], name='job_offer_active_type_idx',
+                         condition=Q(removed=False, confirmed=True)),
+            # archiving of expired offers
+            models.Index(fields=['expiration_date'], name='job_offer_not_removed_exp_idx',
+                         condition=Q(removed=False)),
+        ]
 
     def __str__(self):
         return self.offer_name
 
+    def get_zip_applications(self):
+        return JobOfferApplication.objects.filter(job_offer=self, document__isnull=False) \
+            .exclude(document='') \
+            .select_related('cv__cv_user__user') \
+            .order_by('date_posted')
+
     def generate_zip(self):
-        url = settings.MEDIA_URL + 'application_docs/zip_files/' + \
-               self.offer_name.replace(' ', '_') + '_pliki_cv.zip'
-        path = settings.MEDIA_ROOT + '/application_docs/zip_files/' + \
-               self.offer_name.replace(' ', '_') + '_pliki_cv.zip'
+        """
+        Updates the archive with the documents of all applications to the offer.
+        Documents of new applications are appended to the existing archive,
+        it is built again only when some of the archived applications were removed.
+        """
+        relative_path = 'application_docs/zip_files/' + str(self.id) + '.zip'
+        path = os.path.join(settings.MEDIA_ROOT, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        applications = {application.zip_arcname: application for application in self.get_zip_applications()
+                        if os.path.isfile(application.document.path)}
+
+        archived = set()
         if os.path.isfile(path):
-            os.remove(path)
-        try:
-            zip_file = ZipFile(path, mode='x')
-        except FileNotFoundError:
-            os.mkdir(settings.MEDIA_ROOT + '/application_docs/zip_files/')
-            zip_file = ZipFile(path, mode='x')
-
-        for application in JobOfferApplication.objects.filter(job_offer=self):
-            file_name = application.cv.cv_user.user.first_name + '_' + application.cv.cv_user.user.last_name + '_' +\
-                        datetime.now().strftime('%d-%m-%y') + '.pdf'
-            zip_file.write(application.document.path, arcname=file_name)
-        zip_file.close()
-        self.zip_file = url
-        self.save()
-        
+            with ZipFile(path) as zip_file:
+                archived = set(zip_file.namelist())
+        if not archived.issubset(applications):
+            archived = set()
+        missing = [arcname for arcname in applications if arcname not in archived]
+
+        if missing or not os.path.isfile(path):
+            # the archive is updated on a copy, so it can be downloaded in the meantime
+            fd, tmp_path = tempfile.mkstemp(suffix='.zip', dir=os.path.dirname(path))
+            os.close(fd)
+            try:
+                if archived:
+                    shutil.copyfile(path, tmp_path)
+                with ZipFile(tmp_path, mode='a' if archived else 'w') as zip_file:
+                    for arcname in missing:
+                        zip_file.write(applications[arcname].document.path, arcname=arcname)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        self.zip_file = settings.MEDIA_URL + relative_path
+        JobOffer.objects.filter(id=self.id).update(zip_file=self.zip_file)
+
 
 class JobOfferApplication(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -74,28 +123,72 @@ class JobOfferApplication(models.Model):
     job_offer = models.ForeignKey(JobOffer, on_delete=models.CASCADE)
     date_posted = models.DateTimeField(auto_now_add=True)
     was_read = models.BooleanField(default=False)
-    document = models.FileField(upload_to='application_docs/', null=True)
+    document = models.FileField(upload_to='application_docs/', null=True, db_index=True)
 
     @property
     def cv_url(self):
         return self.document.url if self.document.name else None
+
+    @property
+    def zip_arcname(self):
+        user = self.cv.cv_user.user
+        return f'{user.first_name}_{user.last_name}_{self.id}.pdf'.replace(' ', '_')
     
     def duplicate_docs(self):
-        document_copy = ContentFile(self.cv.document.read())
-        name = self.cv.document.name
-        self.document.save(name, document_copy)
+        """
+        Points the application at an immutable snapshot of the CV document. Snapshots are
+        stored once per content, as hard links to the CV document when possible,
+        and shared by all applications with the same document.
+        """
+        checksum = get_file_checksum(self.cv.document.path)
+        name = f'application_docs/blobs/{checksum[:2]}/{checksum}.pdf'
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            try:
+                os.link(self.cv.document.path, tmp_path)
+            except OSError:
+                shutil.copyfile(self.cv.document.path, tmp_path)
+            os.replace(tmp_path, path)
+        self.document.name = name
+
+
+def get_categories_dictionary():
+    """
+    Returns the ETag and the names of all categories, see get_dictionary.
+    """
+    return get_dictionary(CATEGORIES_DICTIONARY, lambda: list(JobOfferCategory.objects.values_list('name', flat=True)))
+
+
+def get_offer_types_dictionary():
+    """
+    Returns the ETag and the names of all offer types, see get_dictionary.
+    """
+    return get_dictionary(OFFER_TYPES_DICTIONARY, lambda: list(JobOfferType.objects.values_list('name', flat=True)))
+
+
+def get_job_offer_search_vector():
+    config = settings.JOB_OFFER_SEARCH_CONFIG
+    return SearchVector('offer_name', weight='A', config=config) + \
+        SearchVector('company_name', weight='B', config=config) + \
+        SearchVector('description', weight='C', config=config)
 
 
 class JobOfferFilters:
+    SEARCH_FIELDS = ['offer_name', 'company_name', 'description']
+
     def __init__(self,
                  voivodeship=None,
                  min_expiration_date=None,
                  categories=None,
-                 types=None):
+                 types=None,
+                 q=None):
         self.voivodeship = voivodeship
         self.min_expiration_date = min_expiration_date
         self.categories = categories
         self.types = types
+        self.q = q
 
     def get_filters(self):
         filters = dict(
@@ -106,15 +199,143 @@ class JobOfferFilters:
         )
         return {k: v for k, v in filters.items() if v is not None}
 
+    def search(self, queryset):
+        """
+        Narrows the offers down to the ones matching the q phrase, ordered by relevance.
+        PostgreSQL uses the indexed search vector, other databases fall back to
+        requiring every word in one of the searched fields.
+        """
+        if not self.q:
+            return queryset
+        if connections[queryset.db].vendor == 'postgresql':
+            query = SearchQuery(self.q, config=settings.JOB_OFFER_SEARCH_CONFIG)
+            return queryset.filter(search_vector=query) \
+                .annotate(search_rank=SearchRank(F('search_vector'), query)) \
+                .order_by('-search_rank', 'expiration_date')
+        for term in self.q.split():
+            term_filter = Q()
+            for field in self.SEARCH_FIELDS:
+                term_filter |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(term_filter)
+        return queryset.annotate(search_rank=models.Value(0, output_field=models.IntegerField())) \
+            .order_by('expiration_date')
+
+
+def get_unread_count_subquery():
+    unread = JobOfferApplication.objects.filter(job_offer=OuterRef('pk'), was_read=False) \
+        .order_by().values('job_offer').annotate(count=Count('id')).values('count')
+    return Coalesce(Subquery(unread, output_field=models.IntegerField()), 0)
+
+
+def set_applications_read(applications, was_read):
+    """
+    Marks the applications as read or unread and recounts unread applications of their offers.
+    Returns the number of matched applications.
+    """
+    with transaction.atomic():
+        updated = applications.update(was_read=was_read)
+        JobOffer.objects.filter(id__in=applications.values('job_offer_id')) \
+            .update(unread_count=get_unread_count_subquery())
+    return updated
+
+
+def delete_unused_documents(names):
+    """
+    Deletes from filesystem the given application documents no application refers to anymore.
+    """
+    used = set(JobOfferApplication.objects.filter(document__in=names).values_list('document', flat=True))
+    for name in set(names) - used:
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def delete_job_offer_applications(offer_ids):
+    """
+    Deletes all applications of the given offers with a single query, without
+    loading them, and then the documents no other application refers to.
+    Returns the number of deleted applications.
+    """
+    offer_ids = list(offer_ids)
+    if not offer_ids:
+        return 0
+    applications = JobOfferApplication.objects.filter(job_offer_id__in=offer_ids)
+    documents = list(applications.exclude(document='').exclude(document=None)
+                     .values_list('document', flat=True).distinct())
+    # A plain DELETE instead of applications.delete(), which would load every application and send
+    # pre/post_delete for each one. Nothing refers to applications, so skipping the signals only
+    # skips count_deleted_application, whose work is the counter reset below, and the per-file
+    # document cleanup, which delete_unused_documents does for the whole batch.
+    connection = connections[applications.db]
+    field = JobOfferApplication._meta.get_field('job_offer')
+    table = connection.ops.quote_name(JobOfferApplication._meta.db_table)
+    column = connection.ops.quote_name(field.column)
+    params = [field.get_db_prep_value(offer_id, connection) for offer_id in offer_ids]
+    placeholders = ', '.join(['%s'] * len(params))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', params)
+        deleted = cursor.rowcount
+    JobOffer.objects.filter(id__in=offer_ids).update(applications_count=0, unread_count=0)
+    delete_unused_documents(documents)
+    return deleted
+
+
+@receiver(post_save, sender=JobOfferApplication)
+def count_created_application(sender, instance, created, **kwargs):
+    if created:
+        JobOffer.objects.filter(id=instance.job_offer_id).update(
+            applications_count=F('applications_count') + 1,
+            unread_count=F('unread_count') + (0 if instance.was_read else 1))
+
+
+@receiver(post_delete, sender=JobOfferApplication)
+def count_deleted_application(sender, instance, **kwargs):
+    JobOffer.objects.filter(id=instance.job_offer_id, applications_count__gt=0).update(
+        applications_count=F('applications_count') - 1)
+    if not instance.was_read:
+        JobOffer.objects.filter(id=instance.job_offer_id, unread_count__gt=0).update(
+            unread_count=F('unread_count') - 1)
+
 
 @receiver(post_delete, sender=JobOfferApplication)
 def delete_document(sender, instance, **kwargs):
-    if instance.document:
+    """
+    Deletes the document from filesystem when no other application refers to it.
+    """
+    if instance.document and not JobOfferApplication.objects.filter(document=instance.document.name).exists():
         if os.path.isfile(instance.document.path):
             os.remove(instance.document.path)
 
 
+@receiver(post_save, sender=JobOffer)
+def update_search_vector(sender, instance, **kwargs):
+    if connections[instance._state.db].vendor == 'postgresql':
+        JobOffer.objects.filter(id=instance.id).update(search_vector=get_job_offer_search_vector())
+
+
 @receiver(post_save, sender=JobOffer)
 def delete_applications(sender, instance, **kwargs):
     if instance.removed:
-        JobOfferApplication.objects.filter(job_offer=instance).delete()
+        delete_job_offer_applications([instance.id])
+
+
+@receiver(post_save, sender=JobOffer)
+@receiver(post_delete, sender=JobOffer)
+@receiver(post_save, sender=JobOfferCategory)
+@receiver(post_delete, sender=JobOfferCategory)
+@receiver(post_save, sender=JobOfferType)
+@receiver(post_delete, sender=JobOfferType)
+def invalidate_job_offer_list_cache(sender, instance, **kwargs):
+    invalidate_job_offer_list()
+
+
+@receiver(post_save, sender=JobOfferCategory)
+@receiver(post_delete, sender=JobOfferCategory)
+def invalidate_categories_dictionary(sender, instance, **kwargs):
+    invalidate_dictionary(CATEGORIES_DICTIONARY)
+
+
+@receiver(post_save, sender=JobOfferType)
+@receiver(post_delete, sender=JobOfferType)
+def invalidate_offer_types_dictionary(sender, instance, **kwargs):
+    invalidate_dictionary(OFFER_TYPES_DICTIONARY)
@@ -23,6 +23,20 @@ class JobOfferSerializer(serializers.ModelSerializer):
     category = serializers.CharField(source='category.name')
     type = serializers.CharField(source='offer_type.name')
 
+    # the names are checked against the cached dictionaries, the database is asked only about names missing there,
+    # e.g. added by another process whose change is not seen by this one yet
+    def validate_category(self, value):
+        etag, categories = get_categories_dictionary()
+        if value not in categories and not JobOfferCategory.objects.filter(name=value).exists():
+            raise serializers.ValidationError("Nie znaleziono takiej branży ofert pracy")
+        return value
+
+    def validate_type(self, value):
+        etag, offer_types = get_offer_types_dictionary()
+        if value not in offer_types and not JobOfferType.objects.filter(name=value).exists():
+            raise serializers.ValidationError("Nie znaleziono takiego typu oferty pracy")
+        return value
+
     def validate_expiration_date(self, value):
         today = date.today()
         if value < today:
@@ -37,22 +51,18 @@ class JobOfferSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        validated_data['category'] = JobOfferCategory.objects.get(**validated_data['category'])
-        validated_data['offer_type'] = JobOfferType.objects.get(**validated_data['offer_type'])
+        # names are the primary keys of categories and types, so the validated names are assigned directly
+        validated_data['category_id'] = validated_data.pop('category')['name']
+        validated_data['offer_type_id'] = validated_data.pop('offer_type')['name']
         company_address = Address.objects.create(**validated_data['company_address'])
         validated_data['company_address'] = company_address
         return JobOffer(**validated_data)
 
     def update(self, instance, validated_data):
-        try:
-            instance.category = JobOfferCategory.objects.get(name=validated_data.get('category', None))
-        except JobOfferCategory.DoesNotExist:
-            pass
-
-        try:
-            instance.offer_type = JobOfferType.objects.get(name=validated_data.get('type', None))
-        except JobOfferType.DoesNotExist:
-            pass
+        if 'category' in validated_data:
+            instance.category_id = validated_data['category']['name']
+        if 'offer_type' in validated_data:
+            instance.offer_type_id = validated_data['offer_type']['name']
 
         instance.offer_name = validated_data.get('offer_name', instance.offer_name)
         instance.company_name = validated_data.get('company_name', instance.company_name)
@@ -60,9 +70,11 @@ class JobOfferSerializer(serializers.ModelSerializer):
         instance.salary_max = validated_data.get('salary_max', instance.salary_max)
         new_address_data = validated_data.get('company_address', None)
         if new_address_data:
-            new_address = Address.objects.create(**new_address_data)
-            instance.company_address.delete()
-            instance.company_address = new_address
+            # updated in place, deleting the address would delete the offer with its applications
+            Address.objects.filter(id=instance.company_address_id).update(**new_address_data)
+            if JobOffer.company_address.is_cached(instance):
+                for attr, value in new_address_data.items():
+                    setattr(instance.company_address, attr, value)
         instance.voivodeship = validated_data.get('voivodeship', instance.voivodeship)
         instance.expiration_date = validated_data.get('expiration_date', instance.expiration_date)
         instance.description = validated_data.get('description', instance.description)
@@ -77,11 +89,17 @@ class JobOfferSerializer(serializers.ModelSerializer):
         read_only_fields = ['offer_image']
 
 
+class EmployerJobOfferSerializer(JobOfferSerializer):
+    class Meta(JobOfferSerializer.Meta):
+        fields = JobOfferSerializer.Meta.fields + ['applications_count', 'unread_count']
+
+
 class JobOfferFiltersSerializer(serializers.Serializer):
     voivodeship = serializers.CharField(max_length=30, required=False)
     min_expiration_date = serializers.DateField(required=False)
     categories = serializers.ListField(child=serializers.CharField(max_length=30), required=False)
     types = serializers.ListField(child=serializers.CharField(max_length=30), required=False)
+    q = serializers.CharField(max_length=200, required=False, help_text='Wyszukiwana fraza')
 
     def create(self, validated_data):
         return JobOfferFilters(**validated_data)
@@ -91,6 +109,7 @@ class JobOfferFiltersSerializer(serializers.Serializer):
         instance.min_expiration_date = validated_data.get('min_expiration_date', instance.min_expiration_date)
         instance.categories = validated_data.get('categories', instance.categories)
         instance.types = validated_data.get('types', instance.types)
+        instance.q = validated_data.get('q', instance.q)
         return instance
 
 
@@ -116,3 +135,15 @@ class JobOfferApplicationSerializer(serializers.ModelSerializer):
         instance.duplicate_docs()
         instance.save()
         return instance
+
+
+class ApplicationsReadStatusSerializer(serializers.Serializer):
+    was_read = serializers.BooleanField()
+    applications = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=False,
+                                         max_length=1000, help_text='ID aplikacji do oznaczenia')
+    offer_id = serializers.UUIDField(required=False, help_text='ID oferty, której wszystkie aplikacje oznaczyć')
+
+    def validate(self, data):
+        if ('applications' in data) == ('offer_id' in data):
+            raise serializers.ValidationError('Należy podać albo listę aplikacji, albo ofertę pracy')
+        return data
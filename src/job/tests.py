@@ -1,17 +1,31 @@
 from datetime import date, timedelta
+from io import BytesIO, StringIO
+from zipfile import ZipFile
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
 from unittest.mock import MagicMock
 from django.core.files import File
+from django.core.management import call_command, CommandError
+from django.db import connection
 from django.contrib.auth.models import Group
 from rest_framework import status
 from rest_framework.test import APITestCase
 from cv.models import *
 from job.models import *
+from job.cache import clear_local_cache, _local_versions
 from job.enums import Voivodeships
+from job.serializers import JobOfferSerializer
 from account.models import *
 from account.account_type import StaffGroupType
 from account.account_status import AccountStatus
 
 
+def clear_job_caches():
+    caches['default'].clear()
+    clear_local_cache()
+
+
 def create_test_offer_data(name="OFERTA TESTOWA", voivodeship="mazowieckie", expiration_date=date.today() + timedelta(days=10),
                            description="TEST TEST", category='IT', offer_type='Praca'):
     category, _ = JobOfferCategory.objects.get_or_create(name=category)
@@ -74,8 +88,8 @@ def create_mock_document():
     mock_file.read.return_value = "fake file contents"
     return mock_file
 
-def create_cv(user, document):
-    return CV.objects.create(cv_user=user, document=document)
+def create_cv(user, document, render_status=RenderStatus.READY):
+    return CV.objects.create(cv_user=user, document=document, render_status=render_status)
 
 
 def create_job_application(cv_user, offer, document):
@@ -164,6 +178,42 @@ class JobOfferCreateTestCase(APITestCase):
         self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
         self.assertEquals(JobOffer.objects.count(), 0)
 
+    def test_offer_create_unknown_category(self):
+        create_employer(self.user)
+        self.client.force_authenticate(user=self.user)
+        data = create_test_offer_data()
+        data['category'] = 'NIEISTNIEJĄCA'
+        response = self.client.post(self.url, data, format='json')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+        self.assertIn('category', response.data)
+        self.assertEquals(JobOffer.objects.count(), 0)
+
+    def test_offer_create_validates_category_against_dictionary(self):
+        create_employer(self.user)
+        self.client.force_authenticate(user=self.user)
+        data = create_test_offer_data()
+        JobOfferCategory.objects.create(name='Usunięta')
+        clear_job_caches()
+        get_categories_dictionary()
+        get_offer_types_dictionary()
+        with self.assertNumQueries(0):
+            self.assertTrue(JobOfferSerializer(data=data).is_valid())
+
+        # deleting a category invalidates the dictionary
+        JobOfferCategory.objects.get(name='Usunięta').delete()
+        data['category'] = 'Usunięta'
+        response = self.client.post(self.url, data, format='json')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+        self.assertIn('category', response.data)
+
+        # a category the cached dictionary does not know yet is looked up in the database
+        get_categories_dictionary()
+        JobOfferCategory.objects.bulk_create([JobOfferCategory(name='Nowa')])
+        data['category'] = 'Nowa'
+        response = self.client.post(self.url, data, format='json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK, msg=response.data)
+        self.assertEquals(JobOffer.objects.get().category_id, 'Nowa')
+
 
 class JobOfferGetTestCase(APITestCase):
 
@@ -213,6 +263,27 @@ class JobOfferEditTestCase(APITestCase):
         self.assertNotEquals(self.offer.description, edited_offer.description)
         self.assertEquals(edited_offer.description, offer_edit_data['description'])
 
+    def test_offer_edit_category_type_and_address(self):
+        create_staff(self.user)
+        JobOfferCategory.objects.create(name='Gastronomia')
+        JobOfferType.objects.create(name='Staż')
+        application = create_job_application(create_default(create_user('applicant')), self.offer, None)
+        address_id = self.offer.company_address_id
+        self.client.force_authenticate(user=self.user)
+        response = self.client.put(self.url(self.offer.id), data={
+            'category': 'Gastronomia',
+            'type': 'Staż',
+            'company_address': {'city': 'Kraków', 'street': 'Nowa', 'street_number': '1', 'postal_code': '30-001'}
+        }, format='json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK, msg=response.data)
+
+        edited_offer = JobOffer.objects.select_related('company_address').get()
+        self.assertEquals((edited_offer.category_id, edited_offer.offer_type_id), ('Gastronomia', 'Staż'))
+        self.assertEquals(edited_offer.company_address_id, address_id)
+        self.assertEquals(edited_offer.company_address.city, 'Kraków')
+        self.assertEquals(Address.objects.count(), 2)
+        self.assertTrue(JobOfferApplication.objects.filter(id=application.id).exists())
+
     def test_offer_edit_bad_offer_id(self):
         self.assertEquals(JobOffer.objects.count(), 1)
         staff = create_staff(self.user)
@@ -258,6 +329,36 @@ class JobOfferDeleteTestCase(APITestCase):
         self.assertEquals(JobOffer.objects.filter(removed=False).count(), 1)
 
 
+class JobOffersListCacheTestCase(APITestCase):
+
+    @classmethod
+    def setUp(cls):
+        clear_job_caches()
+        cls.url = '/job/job-offers/'
+        cls.offer = create_test_offer_instance(expiration_date=date.today() + timedelta(days=10))
+
+    def test_offer_list_cached(self):
+        response = self.client.get(self.url, {'voivodeship': 'mazowieckie', 'page_size': 5})
+        self.assertEquals(response.status_code, status.HTTP_200_OK, msg=response.data)
+
+        with self.assertNumQueries(1):
+            cached_response = self.client.get(self.url, {'page_size': 5, 'voivodeship': 'mazowieckie'})
+        self.assertEquals(cached_response.data, response.data)
+
+    def test_offer_list_invalidated_on_change(self):
+        response = self.client.get(self.url)
+        self.assertEquals(len(response.data['results']), 1)
+
+        create_test_offer_instance(name='Oferta 2')
+        response = self.client.get(self.url)
+        self.assertEquals(len(response.data['results']), 2)
+
+        self.offer.removed = True
+        self.offer.save()
+        response = self.client.get(self.url)
+        self.assertEquals(len(response.data['results']), 1)
+
+
 class JobOffersListTestCase(APITestCase):
 
     @classmethod
@@ -286,6 +387,30 @@ class JobOffersListTestCase(APITestCase):
         self.assertEquals(len(response.data['results']), 1)
         self.assertEquals(response.data['results'][0]['id'], str(self.offer2.id))
 
+    def test_offer_list_cursor_pagination(self):
+        offer3 = create_test_offer_instance(name='Oferta 3', expiration_date=date(2020, 5, 6))
+        response = self.client.get(self.url, {'pagination': 'cursor', 'page_size': 2})
+        self.assertEquals(response.status_code, status.HTTP_200_OK, msg=response.data)
+        self.assertNotIn('count', response.data)
+        self.assertEquals(len(response.data['results']), 2)
+
+        next_response = self.client.get(response.data['next'])
+        self.assertEquals([offer['id'] for offer in next_response.data['results']], [str(offer3.id)])
+        self.assertIsNone(next_response.data['next'])
+
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEquals(response.data['count'], 3)
+
+    def test_offer_list_search(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {'q': 'NOWA oferta'})
+        self.assertEquals(response.status_code, status.HTTP_200_OK, msg=response.data)
+        self.assertEquals([offer['id'] for offer in response.data['results']], [str(self.offer2.id)])
+
+        response = self.client.get(self.url, {'q': 'testowa', 'ordering': '-voivodeship'})
+        self.assertEquals([offer['id'] for offer in response.data['results']],
+                          [str(self.offer1.id), str(self.offer2.id)])
+
 
 class EmployerJobOffersListTestCase(APITestCase):
 
@@ -326,6 +451,25 @@ class EmployerJobOffersListTestCase(APITestCase):
         self.assertEquals(response.status_code, status.HTTP_200_OK, msg=response.data)
         self.assertEquals(len(response.data['results']), 0)
 
+    def test_employer_offer_list_application_counters(self):
+        default_user = create_default(create_user('applicant'))
+        applications = [create_job_application(default_user, self.employer_offer2, None) for i in range(3)]
+        create_job_application(default_user, self.employer_offer1, None)
+        set_applications_read(JobOfferApplication.objects.filter(id=applications[0].id), True)
+        applications[1].delete()
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {'ordering': '-applications_count'})
+        self.assertEquals(response.status_code, status.HTTP_200_OK, msg=response.data)
+        self.assertEquals([(offer['id'], offer['applications_count'], offer['unread_count'])
+                           for offer in response.data['results']],
+                          [(str(self.employer_offer2.id), 2, 1), (str(self.employer_offer1.id), 1, 1)])
+
+        self.employer_offer2.removed = True
+        self.employer_offer2.save()
+        self.employer_offer2.refresh_from_db()
+        self.assertEquals((self.employer_offer2.applications_count, self.employer_offer2.unread_count), (0, 0))
+
 
 class JobOfferInterestedUsersAddTestCase(APITestCase):
 
@@ -362,6 +506,17 @@ class JobOfferInterestedUsersAddTestCase(APITestCase):
         self.assertEquals(updated_offer.jobofferapplication_set.count(), 1)
 
 
+    def test_offer_insterested_users_add_not_rendered_cv(self):
+        default_user = create_default(self.user)
+        self.client.force_authenticate(user=self.user)
+        for render_status in (RenderStatus.PENDING, RenderStatus.FAILED):
+            cv = create_cv(default_user, create_mock_document(), render_status=render_status)
+            application_data = {'cv': cv.cv_id, 'job_offer': self.offer.id}
+            response = self.client.post(self.url, application_data, format='json')
+            self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+        self.assertEquals(self.offer.jobofferapplication_set.count(), 0)
+
+
 class EmployerJobOfferInterestedUsersListTestCase(APITestCase):
 
     @classmethod
@@ -401,6 +556,12 @@ class VoivodeshipEnumTestCase(APITestCase):
         self.assertEquals(len(response.data['voivodeships']), 16)
         self.assertEquals(sorted(response.data['voivodeships']), sorted(Voivodeships().getKeys()))
 
+    def test_offer_voivodeship_list_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEquals(response['Cache-Control'], 'public, max-age=86400')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
         
 class OfferAdminConfirmTestCase(APITestCase):
 
@@ -458,6 +619,7 @@ class OfferTypesListTestCase(APITestCase):
     def setUp(cls):
         cls.url = '/job/enums/types/'
         cls.user = create_user()
+        clear_job_caches()
 
     def test_offer_type_list_success(self):
         self.client.force_authenticate(user=self.user)
@@ -465,6 +627,20 @@ class OfferTypesListTestCase(APITestCase):
         self.assertEquals(response.status_code, status.HTTP_200_OK, msg=response.data)
         self.assertEquals(sorted(response.data['offer_types']), sorted(list(JobOfferType.objects.values_list('name', flat=True))))
 
+    def test_offer_type_list_invalidated_by_delete(self):
+        JobOfferType.objects.create(name='TESTTYPE')
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('TESTTYPE', response.data['offer_types'])
+
+        self.client.force_authenticate(user=self.user)
+        create_staff(self.user)
+        response = self.client.delete('/job/enums/type/', {'name': 'TESTTYPE'}, format='json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK, msg=response.data)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('TESTTYPE', response.data['offer_types'])
+
 
 class OfferTypeCreateTestCase(APITestCase):
 
@@ -498,6 +674,7 @@ class OfferCategoriesListTestCase(APITestCase):
     def setUp(cls):
         cls.url = '/job/enums/categories/'
         cls.user = create_user()
+        clear_job_caches()
 
     def test_offer_category_list_success(self):
         self.client.force_authenticate(user=self.user)
@@ -505,6 +682,30 @@ class OfferCategoriesListTestCase(APITestCase):
         self.assertEquals(response.status_code, status.HTTP_200_OK, msg=response.data)
         self.assertEquals(sorted(response.data['categories']), sorted(list(JobOfferCategory.objects.values_list('name', flat=True))))
 
+    def test_offer_category_list_not_modified(self):
+        JobOfferCategory.objects.create(name='IT')
+        response = self.client.get(self.url)
+        self.assertEquals(response['Cache-Control'], 'public, no-cache')
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEquals(response['ETag'], etag)
+
+        # once the local version expires only the version is read from the shared cache
+        _local_versions.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.force_authenticate(user=create_staff(self.user).user)
+        self.client.post('/job/enums/category/', {'name': 'TESTCATEGORY'}, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertNotEquals(response['ETag'], etag)
+        self.assertEquals(sorted(response.data['categories']), ['IT', 'TESTCATEGORY'])
+
 
 class OfferCategoryCreateTestCase(APITestCase):
 
@@ -532,3 +733,164 @@ class OfferCategoryCreateTestCase(APITestCase):
         self.assertTrue(JobOfferCategory.objects.filter(name='TESTCATEGORY').exists())
 
 
+
+
+class EmployerApplicationZipTestCase(APITestCase):
+
+    @classmethod
+    def setUp(cls):
+        cls.url = lambda self, id: '/job/employer/application_list/zip/%s/' % id
+        cls.stream_url = lambda self, id: '/job/employer/application_list/zip/%s/stream/' % id
+        cls.employer_user = create_user(username='testemployer')
+        cls.employer = create_employer(cls.employer_user)
+        cls.default_user = create_default(create_user())
+        cls.offer = create_test_offer_instance(employer=cls.employer)
+        cls.applications = [create_job_application(cls.default_user, cls.offer,
+                                                   ContentFile(b'%PDF-1.4 ' + str(i).encode(), name='cv.pdf'))
+                            for i in range(2)]
+
+    def read_archive(self, url):
+        with ZipFile(os.path.join(settings.MEDIA_ROOT, url[len(settings.MEDIA_URL):])) as zip_file:
+            return {name: zip_file.read(name) for name in zip_file.namelist()}
+
+    def test_stream_zip_success(self):
+        self.client.force_authenticate(user=self.employer_user)
+        response = self.client.get(self.stream_url(self.offer.id))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response['Content-Type'], 'application/zip')
+
+        with ZipFile(BytesIO(b''.join(response.streaming_content))) as zip_file:
+            self.assertEquals(zip_file.testzip(), None)
+            self.assertEquals({name: zip_file.read(name) for name in zip_file.namelist()},
+                              {application.zip_arcname: application.document.read()
+                               for application in self.applications})
+
+    def test_stream_zip_other_employer(self):
+        other_user = create_user(username='otheremployer')
+        create_employer(other_user)
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(self.stream_url(self.offer.id))
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_zip_updated_with_applications(self):
+        self.client.force_authenticate(user=self.employer_user)
+        response = self.client.get(self.url(self.offer.id))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(set(self.read_archive(response.data['url'])),
+                          {application.zip_arcname for application in self.applications})
+
+        new_application = create_job_application(self.default_user, self.offer, ContentFile(b'%PDF-1.4 2', name='cv.pdf'))
+        response = self.client.get(self.url(self.offer.id))
+        archive = self.read_archive(response.data['url'])
+        self.assertEquals(len(archive), 3)
+        self.assertEquals(archive[new_application.zip_arcname], b'%PDF-1.4 2')
+
+        self.applications[0].delete()
+        response = self.client.get(self.url(self.offer.id))
+        self.assertEquals(set(self.read_archive(response.data['url'])),
+                          {self.applications[1].zip_arcname, new_application.zip_arcname})
+
+
+class ApplicationDocumentSnapshotTestCase(APITestCase):
+
+    @classmethod
+    def setUp(cls):
+        cls.default_user = create_default(create_user())
+        cls.cv = create_cv(cls.default_user, ContentFile(b'%PDF-1.4 snapshot', name='cv.pdf'))
+        cls.offers = [create_test_offer_instance(name=f'OFERTA {i}') for i in range(2)]
+
+    def apply(self, offer):
+        application = JobOfferApplication.objects.create(cv=self.cv, job_offer=offer)
+        application.duplicate_docs()
+        application.save()
+        return application
+
+    def test_applications_share_snapshot(self):
+        first, second = [self.apply(offer) for offer in self.offers]
+
+        self.assertEquals(first.document.name, second.document.name)
+        self.assertNotEquals(first.document.name, self.cv.document.name)
+        self.assertEquals(first.document.read(), b'%PDF-1.4 snapshot')
+
+        first.delete()
+        self.assertTrue(os.path.isfile(second.document.path))
+        second.delete()
+        self.assertFalse(os.path.isfile(second.document.path))
+        self.assertTrue(os.path.isfile(self.cv.document.path))
+
+    def test_snapshot_outlives_cv_document(self):
+        application = self.apply(self.offers[0])
+        os.remove(self.cv.document.path)
+
+        self.assertEquals(application.document.read(), b'%PDF-1.4 snapshot')
+
+
+class JobOfferIndexesBenchmarkTestCase(APITestCase):
+    def test_benchmark_rolls_back(self):
+        out = StringIO()
+        call_command('benchmark_job_offer_indexes', offers=50, locks_table=True, stdout=out)
+        output = out.getvalue()
+        self.assertIn('With indexes', output)
+        self.assertIn('Without indexes', output)
+        self.assertEqual(JobOffer.objects.count(), 0)
+        self.assertEqual(Address.objects.count(), 0)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, JobOffer._meta.db_table)
+        for index in JobOffer._meta.indexes:
+            self.assertIn(index.name, constraints)
+
+    def test_benchmark_refuses_without_debug(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_job_offer_indexes', offers=50, stdout=StringIO())
+        self.assertEqual(JobOffer.objects.count(), 0)
+
+
+class EmployerApplicationsReadStatusTestCase(APITestCase):
+
+    @classmethod
+    def setUp(cls):
+        cls.url = '/job/employer/application_list/read-status/'
+        cls.employer_user = create_user(username='testemployer')
+        cls.employer = create_employer(cls.employer_user)
+        cls.default_user = create_default(create_user())
+        cls.offer = create_test_offer_instance(employer=cls.employer)
+        cls.other_offer = create_test_offer_instance(employer=create_employer(create_user(username='otheremployer')))
+        cls.applications = [create_job_application(cls.default_user, cls.offer, None) for i in range(3)]
+        cls.other_application = create_job_application(cls.default_user, cls.other_offer, None)
+
+    def read_statuses(self):
+        return dict(JobOfferApplication.objects.values_list('id', 'was_read'))
+
+    def test_mark_applications(self):
+        self.client.force_authenticate(user=self.employer_user)
+        ids = [str(self.applications[0].id), str(self.applications[1].id), str(self.other_application.id)]
+        response = self.client.post(self.url, {'was_read': True, 'applications': ids}, format='json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data, {'updated': 2, 'not_found': 1})
+        self.assertEquals(self.read_statuses(), {self.applications[0].id: True, self.applications[1].id: True,
+                                                 self.applications[2].id: False, self.other_application.id: False})
+
+        response = self.client.post(self.url, {'was_read': False, 'applications': ids[:1]}, format='json')
+        self.assertEquals(response.data, {'updated': 1, 'not_found': 0})
+        self.assertFalse(self.read_statuses()[self.applications[0].id])
+        self.assertEquals(JobOffer.objects.get(id=self.offer.id).unread_count, 2)
+        self.assertEquals(JobOffer.objects.get(id=self.other_offer.id).unread_count, 1)
+
+    def test_mark_offer_applications(self):
+        self.client.force_authenticate(user=self.employer_user)
+        response = self.client.post(self.url, {'was_read': True, 'offer_id': str(self.offer.id)}, format='json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data['updated'], 3)
+        self.assertEquals(JobOfferApplication.objects.filter(was_read=True).count(), 3)
+
+        response = self.client.post(self.url, {'was_read': True, 'offer_id': str(self.other_offer.id)}, format='json')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(self.read_statuses()[self.other_application.id])
+
+    def test_mark_invalid_data(self):
+        self.client.force_authenticate(user=self.employer_user)
+        response = self.client.post(self.url, {'was_read': True}, format='json')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'was_read': True, 'applications': [str(self.applications[0].id)],
+                                               'offer_id': str(self.offer.id)}, format='json')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
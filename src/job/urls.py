@@ -18,7 +18,9 @@ urlpatterns = [
      path('employer/application_list/<uuid:offer_id>/', views.EmployerApplicationListView.as_view()),
      path('employer/application_list/mark-as-read/<uuid:application_id>/', views.EmployerApplicationMarkAsReadView.as_view()),
      path('employer/application_list/zip/<uuid:offer_id>/', views.GetZipFileView.as_view()),
+     path('employer/application_list/zip/<uuid:offer_id>/stream/', views.StreamZipFileView.as_view()),
      path('employer/application_list/mark-as-unread/<uuid:application_id>/', views.EmployerApplicationMarkAsUnreadView.as_view()),
+     path('employer/application_list/read-status/', views.EmployerApplicationsReadStatusView.as_view()),
      # job offers for admins
      path('admin/job-offers/unconfirmed/', views.AdminUnconfirmedJobOffersView.as_view()),
      path('admin/confirm/<uuid:offer_id>/', views.AdminConfirmJobOfferView.as_view()),
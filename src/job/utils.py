@@ -1,5 +1,6 @@
 import uuid
 import os
+from zipfile import ZipFile
 
 
 def __create_file_path(folder, filename):
@@ -11,3 +12,44 @@ def __create_file_path(folder, filename):
 def create_job_offer_image_path(instance, filename):
     return __create_file_path('offers', filename)
 
+
+
+class _ZipStream:
+    """
+    Unseekable buffer for the archive built by stream_zip, emptied after every chunk.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(files, chunk_size=64 * 1024):
+    """
+    Yields a zip archive of the given (path, arcname) pairs chunk by chunk,
+    without building it in memory or on disk. Missing files are skipped.
+    """
+    stream = _ZipStream()
+    with ZipFile(stream, mode='w') as zip_file:
+        for path, arcname in files:
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f, zip_file.open(arcname, mode='w') as entry:
+                for chunk in iter(lambda: f.read(chunk_size), b''):
+                    entry.write(chunk)
+                    data = stream.pop()
+                    if data:
+                        yield data
+            yield stream.pop()
+    yield stream.pop()
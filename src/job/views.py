@@ -1,9 +1,14 @@
+import hashlib
 import os
+import coreapi
+import coreschema
 from notifications.signals import notify
 from rest_framework.parsers import MultiPartParser
 from account.models import EmployerAccount, DefaultAccount, Account
 from account.permissions import *
 from django.core.exceptions import ObjectDoesNotExist
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from django.utils.datastructures import MultiValueDictKeyError
 from django.utils.decorators import method_decorator
 from django_filters.rest_framework import DjangoFilterBackend
@@ -13,13 +18,16 @@ from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, serializers, filters, status, views
 from rest_framework.decorators import permission_classes
 from rest_framework.filters import OrderingFilter
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
+from cv.enums import RenderStatus
 from cv.models import CV
 from .filters import JobOfferApplicationListFilter, JobOfferApplicationOrderingFilter, DjangoFilterDescriptionInspector, \
-    JobOfferOrderingFilter
+    JobOfferOrderingFilter, EmployerJobOfferOrderingFilter
 from .models import *
+from .utils import stream_zip
+from .cache import get_job_offer_list_cache_key, get_cached_job_offer_list, cache_job_offer_list
 from .serializers import *
 from rest_framework.generics import ListAPIView, get_object_or_404
 
@@ -66,16 +74,66 @@ def sample_offerid_response():
     )
 
 
-class OffersPagination(PageNumberPagination):
+class StableCursorPagination(CursorPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+    def get_ordering(self, request, queryset, view):
+        # the position is taken from the first field, so user defined orderings are not supported
+        return self.ordering
 
-class ApplicationsPagination(PageNumberPagination):
+
+class OffersCursorPagination(StableCursorPagination):
+    ordering = ('expiration_date', 'id')
+
+
+class ApplicationsCursorPagination(StableCursorPagination):
+    ordering = ('-date_posted', '-id')
+
+
+class PageNumberOrCursorPagination(PageNumberPagination):
+    """
+    Page number pagination, switched to cursor pagination by pagination=cursor
+    or by the cursor parameter of the links returned in that mode.
+    """
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+    pagination_query_param = 'pagination'
+    cursor_pagination_class = None
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.pagination_query_param) == 'cursor' \
+                or self.cursor_pagination_class.cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_fields(self, view):
+        return super().get_schema_fields(view) + [
+            coreapi.Field(name=self.pagination_query_param, required=False, location='query',
+                          schema=coreschema.String(description='"cursor" włącza stronicowanie kursorem, '
+                                                               'bez liczenia wszystkich wyników')),
+            coreapi.Field(name=self.cursor_pagination_class.cursor_query_param, required=False, location='query',
+                          schema=coreschema.String(description='Kursor z linku "next"/"previous"')),
+        ]
+
+
+class OffersPagination(PageNumberOrCursorPagination):
+    cursor_pagination_class = OffersCursorPagination
+
+
+class ApplicationsPagination(PageNumberOrCursorPagination):
+    cursor_pagination_class = ApplicationsCursorPagination
 
 
 # Create your views here.
@@ -313,16 +371,24 @@ class JobOfferListView(generics.ListAPIView):
     def get_queryset(self):
         job_offer_filters = self.filter_serializer.create(self.filter_serializer.validated_data)
         valid_filters = job_offer_filters.get_filters()
-        return JobOffer.objects.select_related('employer') \
+        queryset = JobOffer.objects.select_related('employer') \
             .select_related('category') \
             .select_related('offer_type') \
             .select_related('company_address') \
             .filter(removed=False, confirmed=True, **valid_filters)
+        return job_offer_filters.search(queryset)
 
     def get(self, request):
         self.filter_serializer = JobOfferFiltersSerializer(data=self.request.query_params)
         if self.filter_serializer.is_valid():
-            return super().get(request)
+            cache_key = get_job_offer_list_cache_key(request)
+            data = get_cached_job_offer_list(cache_key)
+            if data is not None:
+                return Response(data)
+            response = super().get(request)
+            if response.status_code == status.HTTP_200_OK:
+                cache_job_offer_list(cache_key, response.data)
+            return response
         else:
             return Response(self.filter_serializer.errors, status.HTTP_400_BAD_REQUEST)
 
@@ -334,7 +400,7 @@ class CreateJobOfferApplicationView(views.APIView):
         request_body=JobOfferApplicationSerializer,
         responses={
             '201': '"id": application.id',
-            '400': 'Błędy walidacji (np. brakujące pole)',
+            '400': 'Błędy walidacji (np. brakujące pole) / CV nie zostało jeszcze wygenerowane',
             '403': "You do not have permission to perform this action. / Aplikowałeś_aś już na tę ofertę \
                 /  CV o podanym id nie należy do Ciebie"
         },
@@ -344,11 +410,14 @@ class CreateJobOfferApplicationView(views.APIView):
         user = DefaultAccount.objects.get(user=request.user)
         try:
             try:
-                CV.objects.get(cv_user=user, cv_id=request.data['cv'])
+                cv = CV.objects.get(cv_user=user, cv_id=request.data['cv'])
             except KeyError:
                 return ErrorResponse('Należy podać, jakie CV złożyć w aplikacji', status.HTTP_400_BAD_REQUEST)
         except CV.DoesNotExist:
             return ErrorResponse("CV o podanym id nie należy do Ciebie", status.HTTP_403_FORBIDDEN)
+        # an edited CV keeps its previous document until the new one is rendered
+        if not cv.document or cv.render_status != RenderStatus.READY:
+            return ErrorResponse("CV nie zostało jeszcze wygenerowane", status.HTTP_400_BAD_REQUEST)
         try:
             prev_app = JobOfferApplication.objects.filter(cv__cv_user=user,
                                                           job_offer__id=request.data['job_offer'])
@@ -487,8 +556,7 @@ class EmployerApplicationMarkAsReadView(views.APIView):
             return ErrorResponse("Aplikacja nie została złożona na ofertę należącą do \
                                 Ciebie", status.HTTP_403_FORBIDDEN)
 
-        application.was_read = True
-        application.save()
+        set_applications_read(JobOfferApplication.objects.filter(id=application.id), True)
 
         return MessageResponse("Aplikacja została oznaczona jako przeczytana")
 
@@ -519,12 +587,47 @@ class EmployerApplicationMarkAsUnreadView(views.APIView):
             return ErrorResponse("Aplikacja nie została złożona na ofertę należącą do \
                                 Ciebie", status.HTTP_403_FORBIDDEN)
 
-        application.was_read = False
-        application.save()
+        set_applications_read(JobOfferApplication.objects.filter(id=application.id), False)
 
         return MessageResponse("Aplikacja została oznaczona jako nieprzeczytana")
 
 
+class EmployerApplicationsReadStatusView(views.APIView):
+    permission_classes = [IsEmployer]
+
+    @swagger_auto_schema(
+        request_body=ApplicationsReadStatusSerializer,
+        responses={
+            '200': Schema(type='object', properties={
+                'updated': Schema(type='integer'),
+                'not_found': Schema(type='integer')
+            }),
+            '400': 'Błędy walidacji (np. brakujące pole)',
+            '404': sample_error_response("Nie znaleziono oferty")
+        },
+        operation_description="Pozwala oznaczyć wiele aplikacji jako przeczytane lub nieprzeczytane naraz: "
+                              "wybrane aplikacje (applications) albo wszystkie aplikacje na ofertę (offer_id). "
+                              "Zwraca liczbę oznaczonych aplikacji oraz liczbę aplikacji, których nie znaleziono "
+                              "wśród aplikacji na oferty pracodawcy"
+    )
+    def post(self, request):
+        serializer = ApplicationsReadStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        applications = JobOfferApplication.objects.filter(job_offer__employer__user_id=request.user.id)
+        if 'offer_id' in data:
+            if not JobOffer.objects.filter(id=data['offer_id'], employer__user_id=request.user.id).exists():
+                return ErrorResponse("Nie znaleziono oferty", status.HTTP_404_NOT_FOUND)
+            updated = set_applications_read(applications.filter(job_offer_id=data['offer_id']), data['was_read'])
+            return Response({'updated': updated, 'not_found': 0}, status.HTTP_200_OK)
+
+        application_ids = set(data['applications'])
+        updated = set_applications_read(applications.filter(id__in=application_ids), data['was_read'])
+        return Response({'updated': updated, 'not_found': len(application_ids) - updated}, status.HTTP_200_OK)
+
+
 @method_decorator(name='get', decorator=swagger_auto_schema(
     filter_inspectors=[DjangoFilterDescriptionInspector],
     query_serializer=JobOfferFiltersSerializer,
@@ -537,11 +640,11 @@ class EmployerApplicationMarkAsUnreadView(views.APIView):
 ))
 class EmployerJobOffersView(generics.ListAPIView):
     permission_classes = [IsEmployer]
-    serializer_class = JobOfferSerializer
+    serializer_class = EmployerJobOfferSerializer
     pagination_class = OffersPagination
-    filter_backends = [JobOfferOrderingFilter]
+    filter_backends = [EmployerJobOfferOrderingFilter]
     ordering_fields = ['offer_name', 'category', 'voivodeship', 'salary_min', 'salary_max', 'company_name',
-                       'expiration_date']
+                       'expiration_date', 'applications_count', 'unread_count']
     ordering = ['expiration_date']
 
     filter_serializer = None
@@ -637,6 +740,21 @@ class AdminConfirmJobOfferView(views.APIView):
         return ErrorResponse("Błędy walidacji (np. brakujące pole)", status.HTTP_400_BAD_REQUEST)
 
 
+VOIVODESHIPS_ETAG = '"voivodeships-%s"' % hashlib.sha1(' '.join(Voivodeships().getKeys()).encode('utf-8')).hexdigest()
+
+
+def get_dictionary_response(request, etag, data, cache_control='public, no-cache'):
+    """
+    Answers with 304 when the client has the current version of the dictionary.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = Response(data, status=status.HTTP_200_OK)
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
+
+
 class VoivodeshipsEnumView(views.APIView):
     permission_classes = [AllowAny]
 
@@ -644,13 +762,14 @@ class VoivodeshipsEnumView(views.APIView):
         responses={
             '200': Schema(type='object', properties={
                 "voivodeships": Schema(type='array', items=Schema(type='string', default=['w1', 'w2', '...']))
-            })
+            }),
+            '304': 'Lista nie zmieniła się od ostatniego pobrania (nagłówek If-None-Match)'
         },
         operation_description="Zwraca listę województw",
     )
     def get(self, request):
         response = {"voivodeships": Voivodeships().getKeys()}
-        return Response(response, status=status.HTTP_200_OK)
+        return get_dictionary_response(request, VOIVODESHIPS_ETAG, response, cache_control='public, max-age=86400')
 
 
 class JobOfferCategoryListView(views.APIView):
@@ -660,13 +779,14 @@ class JobOfferCategoryListView(views.APIView):
         responses={
             '200': Schema(type='object', properties={
                 "categories": Schema(type='array', items=Schema(type='string', default=['c1', 'c2', '...']))
-            })
+            }),
+            '304': 'Lista nie zmieniła się od ostatniego pobrania (nagłówek If-None-Match)'
         },
         operation_description="Zwraca listę wszystkich kategorii"
     )
     def get(self, request):
-        response = {"categories": list(JobOfferCategory.objects.values_list('name', flat=True))}
-        return Response(response, status=status.HTTP_200_OK)
+        etag, categories = get_categories_dictionary()
+        return get_dictionary_response(request, etag, {"categories": categories})
 
 
 class JobOfferCategoryView(views.APIView):
@@ -701,7 +821,9 @@ class JobOfferCategoryView(views.APIView):
         operation_description="Usuwanie branży ofert pracy",
     )
     def delete(self, request):
+        # the name is only looked up, so its uniqueness is not validated
         serializer = JobOfferCategorySerializer(data=request.data)
+        serializer.fields['name'].validators = []
         if serializer.is_valid():
             name = serializer.validated_data['name']
             try:
@@ -719,13 +841,14 @@ class JobOfferTypesListView(views.APIView):
         responses={
             '200': Schema(type='object', properties={
                 "offer_types": Schema(type='array', items=Schema(type='string', default=['t1', 't2', '...']))
-            })
+            }),
+            '304': 'Lista nie zmieniła się od ostatniego pobrania (nagłówek If-None-Match)'
         },
         operation_description="Zwraca listę wszystkich typów"
     )
     def get(self, request):
-        response = {"offer_types": list(JobOfferType.objects.values_list('name', flat=True))}
-        return Response(response, status=status.HTTP_200_OK)
+        etag, offer_types = get_offer_types_dictionary()
+        return get_dictionary_response(request, etag, {"offer_types": offer_types})
 
 
 class JobOfferTypeView(views.APIView):
@@ -760,7 +883,9 @@ class JobOfferTypeView(views.APIView):
         operation_description="Usuwanie typu oferty pracy",
     )
     def delete(self, request):
+        # the name is only looked up, so its uniqueness is not validated
         serializer = JobOfferTypeSerializer(data=request.data)
+        serializer.fields['name'].validators = []
         if serializer.is_valid():
             name = serializer.validated_data['name']
             try:
@@ -794,3 +919,31 @@ class GetZipFileView(views.APIView):
                 return ErrorResponse("Oferta nie należy do Ciebie", status.HTTP_403_FORBIDDEN)
         except ObjectDoesNotExist:
             return ErrorResponse("Nie znaleziono oferty", status.HTTP_404_NOT_FOUND)
+
+
+class StreamZipFileView(views.APIView):
+    permission_classes = [IsEmployer]
+
+    @swagger_auto_schema(
+        responses={
+            '200': 'Plik zip',
+            '401': '"detail": Nie podano danych uwierzytelniających.',
+            '403': sample_error_response('Oferta nie należy do Ciebie'),
+            '404': sample_error_response('Nie znaleziono oferty')
+        },
+        operation_description="Przesyła pracodawcy plik zip ze spakowanymi plikami CV wszystkich użytkowników, "
+                              "którzy aplikowali na daną ofertę. Archiwum jest tworzone w trakcie przesyłania",
+    )
+    def get(self, request, offer_id):
+        try:
+            offer = JobOffer.objects.get(id=offer_id)
+        except ObjectDoesNotExist:
+            return ErrorResponse("Nie znaleziono oferty", status.HTTP_404_NOT_FOUND)
+        if not IsEmployer().has_object_permission(request, self, offer):
+            return ErrorResponse("Oferta nie należy do Ciebie", status.HTTP_403_FORBIDDEN)
+
+        files = ((application.document.path, application.zip_arcname)
+                 for application in offer.get_zip_applications().iterator())
+        response = StreamingHttpResponse(stream_zip(files), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{offer.id}_pliki_cv.zip"'
+        return response
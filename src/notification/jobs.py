@@ -1,23 +1,73 @@
-from notifications.signals import notify
+import logging
+from notifications.models import Notification
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, Q
 from django.utils import timezone
 from account.models import Account
 from django.conf import settings
 from sendgrid.helpers.mail import Mail
 from account.utils import send_mail_via_sendgrid
-from job.models import JobOffer
+from job.cache import invalidate_job_offer_list
+from job.models import JobOffer, delete_job_offer_applications
+from .models import DailyNotificationSubscription
+from .signals import announce_notification
 
+logger = logging.getLogger(__name__)
 
-def archive_old_job_offers():
-    old_job_offers = JobOffer.objects.filter(expiration_date__lt=timezone.now())\
-        .select_related('employer__user')
-    for offer in old_job_offers:
-        offer.removed = True
-        offer.save()
-        notify.send(offer.employer.user, recipient=offer.employer.user,
-                    verb=f'Twoja oferta pracy {offer.offer_name} została zarchiwizowana',
-                    app='myOffers',
-                    object_id=None
-                    )
+
+def announce_notifications(notifications):
+    """
+    Pushes notifications created with bulk_create, which sends no post_save, to their recipients.
+    The notifications are already stored, so a failed push is only logged.
+    """
+    for notification in notifications:
+        try:
+            announce_notification(notification)
+        except Exception:
+            logger.exception('Announcing notification %s failed', notification.id)
+
+
+def archive_old_job_offers(batch_size=500):
+    """
+    Archives expired offers batch by batch: every batch is marked as removed with one update,
+    its applications are deleted and the employers are notified with one insert.
+    Each batch runs in its own short transaction and its notifications are pushed after it commits.
+    Returns the number of archived offers.
+    """
+    today = timezone.now().date()
+    user_type = ContentType.objects.get_for_model(Account)
+    archived = 0
+    while True:
+        with transaction.atomic():
+            offers = list(JobOffer.objects.select_for_update(of=('self',))
+                          .filter(removed=False, expiration_date__lt=today)
+                          .order_by('id')
+                          .values_list('id', 'offer_name', 'employer__user_id')[:batch_size])
+            if not offers:
+                break
+            offer_ids = [offer_id for offer_id, offer_name, user_id in offers]
+            JobOffer.objects.filter(id__in=offer_ids).update(removed=True)
+            delete_job_offer_applications(offer_ids)
+            timestamp = timezone.now()
+            Notification.objects.bulk_create([
+                Notification(recipient_id=user_id,
+                             actor_content_type=user_type,
+                             actor_object_id=user_id,
+                             verb=f'Twoja oferta pracy {offer_name} została zarchiwizowana',
+                             timestamp=timestamp,
+                             data={'app': 'myOffers', 'object_id': None})
+                for offer_id, offer_name, user_id in offers if user_id
+            ])
+            # read back, bulk_create does not return the ids on every database
+            notifications = list(Notification.objects.select_related('recipient')
+                                 .filter(recipient_id__in=[user_id for offer_id, offer_name, user_id in offers if user_id],
+                                         actor_content_type=user_type, timestamp=timestamp))
+            transaction.on_commit(lambda notifications=notifications: announce_notifications(notifications))
+        archived += len(offers)
+    if archived:
+        invalidate_job_offer_list()
+    return archived
 
 
 def send_email(email, subject, name, part1=None, part2=None, part3=None):
@@ -36,19 +86,39 @@ def send_email(email, subject, name, part1=None, part2=None, part3=None):
     send_mail_via_sendgrid(message)
 
 
+def notify_by_email(user, unread_count):
+    login_url = settings.FRONT_URL + 'login'
+    subject = 'Usamodzielnieni: nowe powiadomienia'
+    part1 = f'Masz {unread_count} nieodczytane powiadomienia.'
+    part2 = 'Aby je wyświetlić, zaloguj się, korzystając z poniższego linka:'
+    part3 = login_url
+    send_email(user.email, subject, user.first_name, part1=part1, part2=part2, part3=part3)
+
+
 def send_notification_email(pk):
     user = Account.objects.get(id=pk)
-    email = user.email
-    login_url = settings.FRONT_URL + 'login'
-    notifications = user.notifications.filter(unread=True)
-
-    if notifications.count() > 0:
-        subject = 'Usamodzielnieni: nowe powiadomienia'
-        part1 = f'Masz {notifications.count()} nieodczytane powiadomienia.'
-        part2 = 'Aby je wyświetlić, zaloguj się, korzystając z poniższego linka:'
-        part3 = login_url
-        send_email(email, subject, user.first_name, part1=part1, part2=part2, part3=part3)
-   
+    unread_count = user.notifications.filter(unread=True).count()
+
+    if unread_count > 0:
+        notify_by_email(user, unread_count)
+
+
+def send_daily_notification_emails():
+    """
+    Sends the daily summary to every subscribed user with unread notifications.
+    Returns the number of sent emails.
+    """
+    users = Account.objects.filter(daily_notifications__isnull=False) \
+        .annotate(unread_count=Count('notifications', filter=Q(notifications__unread=True))) \
+        .filter(unread_count__gt=0) \
+        .only('id', 'email', 'first_name')
+    sent = []
+    for user in users:
+        notify_by_email(user, user.unread_count)
+        sent.append(user.id)
+    DailyNotificationSubscription.objects.filter(user_id__in=sent).update(last_sent=timezone.now())
+    return len(sent)
+
 
 def send_verification_email(pk):
     user = Account.objects.get(id=pk)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from notification.jobs import archive_old_job_offers
+
+
+class Command(BaseCommand):
+    help = 'Archives expired job offers, deletes their applications and notifies the employers. ' \
+           'Meant to be run daily, e.g. from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of offers archived in one transaction')
+
+    def handle(self, *args, **options):
+        archived = archive_old_job_offers(batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} job offers'))
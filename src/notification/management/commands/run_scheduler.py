@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from notification.scheduler import Scheduler, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs the periodic jobs when they are due. Can run next to the daphne processes, ' \
+           'a job is never run by two processes at once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the due jobs and exit')
+        parser.add_argument('--interval', type=int, default=settings.SCHEDULER['INTERVAL'],
+                            help='Number of seconds between checks for due jobs')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            done = run_pending_jobs()
+            self.stdout.write(self.style.SUCCESS(f'Ran {len(done)} jobs: {", ".join(done) or "none due"}'))
+            return
+        scheduler = Scheduler(options['interval'])
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            scheduler.stop()
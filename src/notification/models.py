@@ -0,0 +1,20 @@
+from django.db import models
+from account.models import Account
+
+
+class ScheduledJob(models.Model):
+    name = models.CharField(max_length=100, primary_key=True)
+    next_run = models.DateTimeField()
+    last_run = models.DateTimeField(null=True)
+    # the process running the job holds it until locked_until, see notification.scheduler
+    locked_until = models.DateTimeField(null=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class DailyNotificationSubscription(models.Model):
+    user = models.OneToOneField(Account, on_delete=models.CASCADE, related_name='daily_notifications')
+    date_created = models.DateTimeField(auto_now_add=True)
+    last_sent = models.DateTimeField(null=True)
@@ -0,0 +1,122 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import ScheduledJob
+
+logger = logging.getLogger(__name__)
+
+# name: (callable, local time of the daily run or interval between runs)
+JOBS = {
+    'archive_old_job_offers': ('notification.jobs.archive_old_job_offers', time(0, 30)),
+    'send_daily_notification_emails': ('notification.jobs.send_daily_notification_emails', time(6, 0)),
+    'render_pending_cvs': ('cv.rendering.render_pending_cvs', timedelta(minutes=15)),
+    'retry_failed_cv_renders': ('cv.rendering.retry_failed_cv_renders', time(3, 0)),
+}
+
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_next_run(run_time, now):
+    """
+    Returns the first moment after now at which the local time is run_time,
+    or now + run_time when it is an interval.
+    """
+    if isinstance(run_time, timedelta):
+        return now + run_time
+    day = timezone.localtime(now).date()
+    next_run = timezone.make_aware(datetime.combine(day, run_time), is_dst=False)
+    if next_run <= now:
+        next_run = timezone.make_aware(datetime.combine(day + timedelta(days=1), run_time), is_dst=False)
+    return next_run
+
+
+def register_jobs(now):
+    ScheduledJob.objects.bulk_create([
+        ScheduledJob(name=name, next_run=get_next_run(run_time, now)) for name, (path, run_time) in JOBS.items()
+    ], ignore_conflicts=True)
+
+
+def acquire_job(name, now):
+    """
+    Locks the due job for this process. The conditional update succeeds in one process only,
+    so a job is run once even when many processes run the scheduler. The lock of a process
+    that died expires after the lease.
+    """
+    lease = timedelta(seconds=settings.SCHEDULER['LEASE'])
+    return ScheduledJob.objects \
+        .filter(Q(locked_until=None) | Q(locked_until__lt=now), name=name, next_run__lte=now) \
+        .update(locked_until=now + lease, locked_by=WORKER_ID) == 1
+
+
+def run_job(name, now):
+    path, run_time = JOBS[name]
+    logger.info('Running scheduled job %s', name)
+    try:
+        import_string(path)()
+    except Exception:
+        logger.exception('Scheduled job %s failed', name)
+    finally:
+        ScheduledJob.objects.filter(name=name, locked_by=WORKER_ID).update(
+            last_run=now, next_run=get_next_run(run_time, timezone.now()), locked_until=None, locked_by='')
+
+
+def run_pending_jobs():
+    """
+    Runs the jobs that are due and not run by another process. Returns names of the jobs run.
+    """
+    now = timezone.now()
+    register_jobs(now)
+    done = []
+    for name in ScheduledJob.objects.filter(name__in=JOBS, next_run__lte=now).values_list('name', flat=True):
+        if acquire_job(name, now):
+            run_job(name, now)
+            done.append(name)
+    return done
+
+
+class Scheduler(threading.Thread):
+    """
+    Checks for due jobs every interval seconds until stopped.
+    """
+
+    def __init__(self, interval):
+        super().__init__(name='scheduler', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            close_old_connections()
+            try:
+                run_pending_jobs()
+            except Exception:
+                logger.exception('Checking scheduled jobs failed')
+            finally:
+                close_old_connections()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_scheduler():
+    """
+    Starts the process-wide scheduler thread, if it is not running yet.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(settings.SCHEDULER['INTERVAL'])
+            _scheduler.start()
+    return _scheduler
@@ -8,14 +8,18 @@ from chat.serializers import ChatMessageSerializer
 from notification.serializers import NotificationSerializer
 
 
+def announce_notification(notification):
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(
+        notification.recipient.username, {
+            "event": "Nowe powiadomienie",
+            "type": "new_notification",
+            "data": NotificationSerializer(instance=notification).data
+        }
+    )
+
+
 @receiver(post_save, sender=Notification)
 def announce_new_notification(sender, instance, created, **kwargs):
     if created:
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            instance.recipient.username, {
-                "event": "Nowe powiadomienie",
-                "type": "new_notification",
-                "data": NotificationSerializer(instance=instance).data
-            }
-        )
\ No newline at end of file
+        announce_notification(instance)
@@ -1,3 +1,173 @@
-from django.test import TestCase
+import os
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from notifications.models import Notification
+from rest_framework import status
+from rest_framework.test import APITestCase
+from job.models import JobOffer, JobOfferApplication
+from notification import scheduler
+from notification.jobs import send_daily_notification_emails
+from notification.models import DailyNotificationSubscription, ScheduledJob
+from job.tests import create_user, create_employer, create_default, create_cv, create_test_offer_instance
 
-# Create your tests here.
+
+class ArchiveJobOffersTestCase(APITestCase):
+
+    def setUp(self):
+        self.employer = create_employer(create_user('employer'))
+        self.default_user = create_default(create_user())
+        self.cv = create_cv(self.default_user, ContentFile(b'%PDF-1.4 archive', name='cv.pdf'))
+        yesterday = date.today() - timedelta(days=1)
+        self.expired = [create_test_offer_instance(name=f'STARA {i}', expiration_date=yesterday,
+                                                   employer=self.employer) for i in range(3)]
+        self.archived = create_test_offer_instance(name='ARCHIWALNA', expiration_date=yesterday,
+                                                   employer=self.employer)
+        JobOffer.objects.filter(id=self.archived.id).update(removed=True)
+        self.active = create_test_offer_instance(name='AKTUALNA', expiration_date=date.today(),
+                                                 employer=self.employer)
+
+    def apply(self, offer):
+        application = JobOfferApplication.objects.create(cv=self.cv, job_offer=offer)
+        application.duplicate_docs()
+        application.save()
+        return application
+
+    def test_archive_job_offers(self):
+        expired_application = self.apply(self.expired[0])
+        active_application = self.apply(self.active)
+        other_application = self.apply(self.expired[1])
+
+        out = StringIO()
+        call_command('archive_job_offers', batch_size=2, stdout=out)
+
+        self.assertIn('Archived 3 job offers', out.getvalue())
+        self.assertEqual(set(JobOffer.objects.filter(removed=True).values_list('id', flat=True)),
+                         {offer.id for offer in self.expired + [self.archived]})
+        self.assertEqual(list(JobOfferApplication.objects.values_list('id', flat=True)), [active_application.id])
+        self.assertTrue(os.path.isfile(active_application.document.path))
+        notifications = self.employer.user.notifications.all()
+        self.assertEqual(sorted(n.verb for n in notifications),
+                         [f'Twoja oferta pracy STARA {i} została zarchiwizowana' for i in range(3)])
+        self.assertEqual(notifications[0].data['app'], 'myOffers')
+
+        active_application.delete()
+        self.assertFalse(os.path.isfile(expired_application.document.path))
+        self.assertFalse(os.path.isfile(other_application.document.path))
+
+    @patch('notification.jobs.announce_notification')
+    def test_archive_job_offers_announces_notifications(self, announce_mock):
+        # the test transaction never commits, so the callbacks are run at once
+        with patch('django.db.transaction.on_commit', side_effect=lambda func: func()):
+            call_command('archive_job_offers', batch_size=2, stdout=StringIO())
+
+        announced = [call[0][0] for call in announce_mock.call_args_list]
+        self.assertEqual(sorted(notification.verb for notification in announced),
+                         [f'Twoja oferta pracy STARA {i} została zarchiwizowana' for i in range(3)])
+        self.assertTrue(all(notification.id and notification.recipient == self.employer.user
+                            for notification in announced))
+
+    def test_archive_job_offers_deletes_unused_documents(self):
+        application = self.apply(self.expired[0])
+
+        call_command('archive_job_offers', stdout=StringIO())
+
+        self.assertFalse(JobOfferApplication.objects.exists())
+        self.assertFalse(os.path.isfile(application.document.path))
+        self.assertTrue(os.path.isfile(self.cv.document.path))
+
+        call_command('archive_job_offers', stdout=StringIO())
+        self.assertEqual(self.employer.user.notifications.count(), 3)
+
+
+def create_notification(user, unread=True):
+    # bulk_create skips the websocket announcement
+    Notification.objects.bulk_create([Notification(recipient=user, actor_content_type=ContentType.objects.get_for_model(user),
+                                                   actor_object_id=user.id, verb='TEST', unread=unread)])
+
+
+class SchedulerTestCase(APITestCase):
+
+    def test_get_next_run(self):
+        now = timezone.make_aware(datetime(2020, 6, 1, 12, 0))
+        self.assertEqual(scheduler.get_next_run(time(13, 0), now), timezone.make_aware(datetime(2020, 6, 1, 13, 0)))
+        self.assertEqual(scheduler.get_next_run(time(12, 0), now), timezone.make_aware(datetime(2020, 6, 2, 12, 0)))
+
+    @patch.dict(scheduler.JOBS, clear=True, test=('unittest.mock.sentinel', time(6, 0)))
+    def test_run_pending_jobs(self):
+        with patch('notification.scheduler.import_string') as import_string:
+            self.assertEqual(scheduler.run_pending_jobs(), [])
+            job = ScheduledJob.objects.get(name='test')
+            self.assertGreater(job.next_run, timezone.now())
+
+            ScheduledJob.objects.filter(name='test').update(next_run=timezone.now() - timedelta(minutes=1))
+            self.assertEqual(scheduler.run_pending_jobs(), ['test'])
+            self.assertEqual(scheduler.run_pending_jobs(), [])
+            self.assertEqual(import_string.return_value.call_count, 1)
+
+        job.refresh_from_db()
+        self.assertIsNotNone(job.last_run)
+        self.assertIsNone(job.locked_until)
+        self.assertGreater(job.next_run, timezone.now())
+
+    @patch.dict(scheduler.JOBS, clear=True, test=('unittest.mock.sentinel', time(6, 0)))
+    def test_job_locked_by_other_process(self):
+        now = timezone.now()
+        scheduler.register_jobs(now)
+        ScheduledJob.objects.filter(name='test').update(next_run=now - timedelta(minutes=1),
+                                                        locked_until=now + timedelta(minutes=5), locked_by='other')
+
+        self.assertFalse(scheduler.acquire_job('test', now))
+        self.assertTrue(scheduler.acquire_job('test', now + timedelta(minutes=6)))
+        self.assertEqual(ScheduledJob.objects.get(name='test').locked_by, scheduler.WORKER_ID)
+
+    @patch.dict(scheduler.JOBS, clear=True, test=('unittest.mock.sentinel', time(6, 0)))
+    def test_failed_job_is_rescheduled(self):
+        now = timezone.now()
+        scheduler.register_jobs(now)
+        ScheduledJob.objects.filter(name='test').update(next_run=now - timedelta(minutes=1))
+
+        with patch('notification.scheduler.import_string', side_effect=ImportError):
+            self.assertEqual(scheduler.run_pending_jobs(), ['test'])
+        job = ScheduledJob.objects.get(name='test')
+        self.assertIsNone(job.locked_until)
+        self.assertGreater(job.next_run, now)
+
+
+class DailyNotificationsTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = create_user()
+        self.client.force_authenticate(user=self.user)
+
+    def test_start_and_stop(self):
+        response = self.client.post('/notification/start-daily/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.post('/notification/start-daily/')
+        self.assertEqual(DailyNotificationSubscription.objects.filter(user=self.user).count(), 1)
+
+        response = self.client.post('/notification/stop-daily/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(DailyNotificationSubscription.objects.exists())
+
+    @override_settings(FRONT_URL='https://usamodzielnieni.pl/')
+    @patch('notification.jobs.send_email')
+    def test_send_daily_notification_emails(self, send_email):
+        other_user = create_user('other')
+        unsubscribed_user = create_user('unsubscribed')
+        DailyNotificationSubscription.objects.create(user=self.user)
+        DailyNotificationSubscription.objects.create(user=other_user)
+        for user in (self.user, self.user, unsubscribed_user):
+            create_notification(user)
+        create_notification(other_user, unread=False)
+
+        self.assertEqual(send_daily_notification_emails(), 1)
+        send_email.assert_called_once()
+        self.assertEqual(send_email.call_args[0][0], self.user.email)
+        self.assertIn('Masz 2 nieodczytane', send_email.call_args[1]['part1'])
+        self.assertIsNotNone(DailyNotificationSubscription.objects.get(user=self.user).last_sent)
@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from rest_framework import views, generics, status
 from account.models import Account
 from job.views import MessageResponse, ErrorResponse
+from notification.models import DailyNotificationSubscription
 from notification.serializers import *
 
 
@@ -130,8 +131,7 @@ class StartDailyNotifications(views.APIView):
         operation_description='Włącza dzienne podsumowania mailowe powiadomień'
     )
     def post(self, request):
-        pk = request.user.id
-        #start_scheduler(pk)
+        DailyNotificationSubscription.objects.get_or_create(user=request.user)
         return MessageResponse('Powiadomienia będą wysyłane na adres mailowy codziennie o 06:00')
 
 
@@ -143,8 +143,7 @@ class StopDailyNotifications(views.APIView):
         operation_description='Wyłącza dzienne podsumowania mailowe powiadomień'
     )
     def post(self, request):
-        pk = request.user.id
-        #stop_scheduler(pk)
+        DailyNotificationSubscription.objects.filter(user=request.user).delete()
         return MessageResponse('Powiadomienia nie będą już wysyłane na adres mailowy')
 
 
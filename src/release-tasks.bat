@@ -1,5 +1,6 @@
 @ECHO OFF
 python manage.py migrate 
+python manage.py createcachetable
 python manage.py loaddata test_account.json
 python manage.py loaddata test_cv.json
 python manage.py loaddata test_blog.json
@@ -1,5 +1,6 @@
 #!/bin/bash
 python manage.py migrate --run-syncdb
+python manage.py createcachetable
 python manage.py loaddata test_account.json
 python manage.py loaddata test_cv.json
 python manage.py loaddata test_blog.json
@@ -1,9 +1,14 @@
 import os
 import django
 from channels.routing import get_default_application
+from django.conf import settings
 import dotenv
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "usamo.settings.settings")
 dotenv.read_dotenv(override=True)
 django.setup()
-application = get_default_application()
\ No newline at end of file
+application = get_default_application()
+
+if settings.SCHEDULER['AUTOSTART']:
+    from notification.scheduler import start_scheduler
+    start_scheduler()
\ No newline at end of file
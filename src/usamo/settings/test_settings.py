@@ -11,6 +11,41 @@ CONTACT_EMAIL = os.getenv('CONTACT_EMAIL', 'kontakt@usamodzielnieni.pl')
 SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY')
 SENDGRID_TEMPLATE_ID = os.getenv('SENDGRID_TEMPLATE_ID')
 WKHTMLTOPDF_BINARY = '/app/bin/wkhtmltopdf'
+CV_RENDER_ASYNC = True
+CV_TEMPLATES_CACHE_DIR = os.getenv('CV_TEMPLATES_CACHE_DIR')
+CV_RENDER_WORKERS = int(os.getenv('CV_RENDER_WORKERS', 2))
+# seconds after which a pending render is considered lost and queued again by the scheduler
+CV_RENDER_PENDING_TIMEOUT = int(os.getenv('CV_RENDER_PENDING_TIMEOUT', 600))
+CV_RENDERER = {
+    'BACKEND': 'cv.renderers.ProcessRenderer',
+}
+# text search configuration of job offers, e.g. a Polish one if installed on the database server
+JOB_OFFER_SEARCH_CONFIG = os.getenv('JOB_OFFER_SEARCH_CONFIG', 'simple')
+# the cache is shared by all daphne processes, so an invalidation in one process is seen by the others;
+# the table is created by createcachetable
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'usamo_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 5000)),
+        },
+    }
+}
+JOB_OFFER_LIST_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': int(os.getenv('JOB_OFFER_LIST_CACHE_TIMEOUT', 60)),
+    # seconds a process uses the cached versions without asking the shared cache, so changes made
+    # in other processes are seen after up to this time
+    'LOCAL_VERSION_TIMEOUT': int(os.getenv('JOB_CACHE_LOCAL_VERSION_TIMEOUT', 5)),
+}
+# periodic jobs of notification.scheduler, run by every daphne process when autostarted;
+# a job is locked for LEASE seconds, so it must finish within that time
+SCHEDULER = {
+    'AUTOSTART': os.getenv('SCHEDULER_AUTOSTART', '0') == '1',
+    'INTERVAL': int(os.getenv('SCHEDULER_INTERVAL', 60)),
+    'LEASE': int(os.getenv('SCHEDULER_LEASE', 30 * 60)),
+}
 
 DEBUG = False
 
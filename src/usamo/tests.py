@@ -14,6 +14,8 @@ class TempMediaRunner(DiscoverRunner):
         self.backup['MEDIA_ROOT'] = settings.MEDIA_ROOT
         self.temp_media_root = tempfile.mkdtemp()
         settings.MEDIA_ROOT = self.temp_media_root
+        self.backup['CV_RENDER_ASYNC'] = settings.CV_RENDER_ASYNC
+        settings.CV_RENDER_ASYNC = False
 
     def teardown_databases(self, old_config, **kwargs):
         def close_sessions(conn):